@@ -1,9 +1,32 @@
+import asyncio
+import hashlib
+import logging
 import os
+import random
+import time
+from collections import OrderedDict
 import httpx
+import orjson
+from typing import List, Optional, Union
 from dotenv import load_dotenv
 
+from agent.prompts import ACTION_RESPONSE_FORMAT, build_system_blocks
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Retry policy for OpenRouter calls
+MAX_ATTEMPTS = 3
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+BACKOFF_JITTER = 0.5
+
+# Cache for identical (model, system, user) requests
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 600  # seconds
+
 class LLM:
     def __init__(self):
         self.api_key = os.getenv("OPENROUTER_API_KEY")
@@ -14,69 +37,278 @@ class LLM:
 
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
 
+        # Generation defaults — JSON actions fit comfortably in a few hundred tokens
+        self.max_tokens = int(os.getenv("LLM_MAX_TOKENS", "400"))
+        self.temperature = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+
         # Session client for re-use (faster)
+        # HTTP/2 multiplexes concurrent requests over one TLS connection
         self.client = httpx.AsyncClient(
-            timeout=30.0,
+            http2=True,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(
+                max_keepalive_connections=32,
+                max_connections=128,
+                keepalive_expiry=60,
+            ),
             headers={
                 "Authorization": f"Bearer {self.api_key}",
                 "HTTP-Referer": "http://localhost",
-                "X-Title": "Appointment Scheduler Agent"
+                "X-Title": "Appointment Scheduler Agent",
+                "Content-Type": "application/json",
             }
         )
 
-    async def respond(self, system_prompt: str, user_message: str, stream: bool = False):
+        # Models without structured-output support get the action formats in the prompt
+        self.structured_outputs = os.getenv("LLM_STRUCTURED_OUTPUTS", "1") != "0"
+
+        # The constant system blocks never change — encode them once; each turn
+        # only serializes its dynamic block, the user message and options
+        self._cached_blocks = build_system_blocks(schema_doc=not self.structured_outputs)
+        self._body_prefix = (
+            b'{"model":' + orjson.dumps(self.model)
+            + b',"messages":[{"role":"system","content":['
+            + b",".join(orjson.dumps(b) for b in self._cached_blocks)
+        )
+
+        # Back-pressure: cap in-flight OpenRouter requests below the pool size
+        self._sem = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "32")))
+
+        # LRU of key -> (expires_at, reply)
+        self._cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+    def _system_message(self, system_prompt: Union[str, List[dict]]) -> dict:
         """
-        Send a message to OpenRouter with retries, optional streaming.
+        Build the system message. Accepts a plain string (e.g. FAQ_PROMPT) or a list of
+        content blocks from build_system_blocks(). Anthropic models need an
+        explicit cache_control marker; OpenAI-style models cache the prefix
+        automatically.
         """
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
+        if isinstance(system_prompt, list):
+            return {"role": "system", "content": system_prompt}
+
+        if self.model.startswith("anthropic/"):
+            return {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+                ],
+            }
+        return {"role": "system", "content": system_prompt}
+
+    def _generation_options(self, max_tokens: Optional[int], temperature: Optional[float]) -> dict:
+        """Per-call generation limits, falling back to the client defaults."""
+        return {
+            "max_tokens": self.max_tokens if max_tokens is None else max_tokens,
+            "temperature": self.temperature if temperature is None else temperature,
         }
 
-        # ---- Optional: enable streaming ----
+    def _build_body(
+        self,
+        system_prompt: Union[str, List[dict]],
+        user_message: str,
+        stream: bool = False,
+        **options,
+    ) -> bytes:
+        """
+        Build the encoded request body shared by respond() and stream_reply().
+        When the system prompt starts with the constant blocks from
+        build_system_blocks(), their pre-encoded prefix is spliced in, so only
+        the remaining blocks, the user message and options are serialized.
+        """
         if stream:
-            payload["stream"] = True
+            options["stream"] = True
+        user_msg = {"role": "user", "content": user_message}
+
+        n = len(self._cached_blocks)
+        if not (
+            isinstance(system_prompt, list)
+            and len(system_prompt) >= n
+            and all(a is b for a, b in zip(system_prompt, self._cached_blocks))
+        ):
+            return orjson.dumps({
+                "model": self.model,
+                "messages": [self._system_message(system_prompt), user_msg],
+                **options,
+            })
+
+        dynamic = b"".join(b"," + orjson.dumps(b) for b in system_prompt[n:])
+        tail = b"]," + orjson.dumps(options)[1:] if options else b"]}"
+        return self._body_prefix + dynamic + b"]}," + orjson.dumps(user_msg) + tail
+
+    async def respond(
+        self,
+        system_prompt: Union[str, List[dict]],
+        user_message: str,
+        stream: bool = False,
+        response_format: Optional[dict] = ACTION_RESPONSE_FORMAT,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ):
+        """
+        Send a message to OpenRouter with retries, optional streaming.
+        By default the reply is constrained to the agent action schema;
+        pass response_format=None for free-form text.
+        """
+        options = self._generation_options(max_tokens, temperature)
+
+        # ---- Structured output ----
+        if response_format and self.structured_outputs:
+            options["response_format"] = response_format
 
-        # ---- Retry logic ----
-        for attempt in range(3):  # 3 retries
+        body = self._build_body(system_prompt, user_message, stream, **options)
+
+        # ---- Cached reply for identical requests (not for streaming) ----
+        key = None if stream else self._cache_key(body)
+        if key:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
+
+        # ---- Retry logic (exponential backoff + jitter) ----
+        for attempt in range(MAX_ATTEMPTS):
+            retry_after = None
             try:
-                response = await self.client.post(self.base_url, json=payload)
+                async with self._sem:
+                    response = await self.client.post(self.base_url, content=body)
 
                 if response.status_code == 200:
                     data = response.json()
-                    return data["choices"][0]["message"]["content"]
+                    content = data["choices"][0]["message"]["content"]
+                    if key:
+                        self._cache_put(key, content)
+                    return content
+
+                logger.warning("OpenRouter error %s: %s", response.status_code, response.text[:256])
+
+                # Auth / validation errors won't get better by retrying
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise RuntimeError(f"❌ LLM request rejected ({response.status_code})")
+
+                retry_after = self._retry_after(response)
+
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                logger.warning("LLM attempt %d failed: %s", attempt + 1, e)
 
-                else:
-                    print(f"⚠️ OpenRouter error {response.status_code}: {response.text}")
+            if attempt < MAX_ATTEMPTS - 1:
+                await asyncio.sleep(retry_after if retry_after is not None else self._backoff(attempt))
 
-            except Exception as e:
-                print(f"⚠️ Attempt {attempt+1} failed: {e}")
+        raise RuntimeError(f"❌ LLM request failed after {MAX_ATTEMPTS} retries")
 
-        raise RuntimeError("❌ LLM request failed after 3 retries")
+    @staticmethod
+    def _cache_key(body: bytes) -> str:
+        """The encoded body already pins model, prompts and options."""
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
 
-    async def stream_reply(self, system_prompt: str, user_message: str):
+    def _cache_get(self, key: str) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, content = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return content
+
+    def _cache_put(self, key: str, content: str):
+        self._cache[key] = (time.monotonic() + RESPONSE_CACHE_TTL, content)
+        self._cache.move_to_end(key)
+        while len(self._cache) > RESPONSE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Exponential backoff delay with random jitter."""
+        return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) + random.random() * BACKOFF_JITTER
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        """Seconds from a numeric Retry-After header, capped at BACKOFF_CAP."""
+        value = response.headers.get("Retry-After")
+        try:
+            return min(BACKOFF_CAP, max(0.0, float(value)))
+        except (TypeError, ValueError):
+            return None
+
+    async def stream_reply(
+        self,
+        system_prompt: Union[str, List[dict]],
+        user_message: str,
+        flush_interval_ms: int = 40,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ):
         """
         Return a streaming generator for real-time tokens.
+        Content deltas are parsed here and yielded as text, coalesced into
+        one chunk per flush interval instead of one per SSE event.
         """
-        payload = {
-            "model": self.model,
-            "stream": True,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ]
-        }
+        options = self._generation_options(max_tokens, temperature)
+        body = self._build_body(system_prompt, user_message, stream=True, **options)
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            async with client.stream("POST", self.base_url, json=payload) as response:
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        try:
-                            chunk = line.removeprefix("data: ")
-                            if chunk != "[DONE]":
-                                yield chunk
-                        except:
+        loop = asyncio.get_running_loop()
+        interval = flush_interval_ms / 1000
+        buffer: List[str] = []
+        deadline = 0.0
+        pending = None
+
+        async with self._sem:
+            async with self.client.stream("POST", self.base_url, content=body) as response:
+                deltas = self._sse_deltas(response)
+                try:
+                    while True:
+                        if pending is None:
+                            pending = asyncio.ensure_future(deltas.__anext__())
+
+                        # Wait for the next delta, but never past the flush deadline
+                        timeout = max(0.0, deadline - loop.time()) if buffer else None
+                        done, _ = await asyncio.wait({pending}, timeout=timeout)
+                        if not done:
+                            yield "".join(buffer)
+                            buffer.clear()
                             continue
+
+                        try:
+                            delta = pending.result()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            pending = None
+
+                        if not buffer:
+                            deadline = loop.time() + interval
+                        buffer.append(delta)
+                finally:
+                    if pending is not None:
+                        pending.cancel()
+                        await asyncio.gather(pending, return_exceptions=True)
+                    await deltas.aclose()
+
+        if buffer:
+            yield "".join(buffer)
+
+    @staticmethod
+    async def _sse_deltas(response: httpx.Response):
+        """
+        Yield non-empty content deltas from an SSE response.
+        Parses raw bytes directly rather than decoding every line to str.
+        """
+        buf = bytearray()
+        async for chunk in response.aiter_bytes():
+            buf += chunk
+            while (nl := buf.find(b"\n")) != -1:
+                line = bytes(buf[:nl]).rstrip(b"\r")
+                del buf[:nl + 1]
+
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[6:]
+                if data == b"[DONE]":
+                    return
+                try:
+                    delta = orjson.loads(data)["choices"][0]["delta"].get("content")
+                except (orjson.JSONDecodeError, KeyError, IndexError):
+                    continue
+                if delta:
+                    yield delta
@@ -1,100 +1,150 @@
-SYSTEM_PROMPT = """
-You are a medical appointment scheduling assistant for HealthCare Plus Clinic.
-
-Your job is to:
-1. Greet patients warmly
-2. Identify the reason for visit
-3. Determine appointment type (consultation, followup, physical exam, specialist)
-4. Ask for preferred date or time range
-5. Request available time slots using the availability tool
-6. Recommend 3–5 best slots to the user
-7. Collect details (name, email, phone)
-8. Book appointment using booking tool
-9. Answer FAQs using the RAG system
-10. Handle conversation interruptions gracefully
-
---------------------------------------
-CORE RULES
---------------------------------------
-- NEVER invent available slots.
-- ALWAYS call tools in JSON format.
-- ALWAYS respond in JSON.
-- You MUST maintain context. (If user changes topic, handle and return.)
-- After answering FAQ, return to scheduling automatically.
-- If ambiguity occurs ("tomorrow afternoon"), ask clarifying questions.
-
---------------------------------------
-VALID OUTPUT ACTIONS
---------------------------------------
-Your response must be exactly ONE of these JSON types:
-
-1. Simple conversational reply:
-{
-  "action": "reply",
-  "message": "..."
-}
+import re
+import textwrap
+from typing import Any, Dict, Final, List, Optional
+
+# Keep these byte-identical across requests so providers can cache the prefix.
+# Anything that changes per turn (dates, slots) goes into the dynamic block.
+
+# Identity, rules and tone — practically never changes
+SYSTEM_STATIC: Final[str] = textwrap.dedent("""
+You are the appointment scheduling assistant for HealthCare Plus Clinic.
+Tone: warm, human, professional.
+
+Rules:
+1. Never invent available slots; only offer slots returned by the availability tool.
+2. Always respond with a single JSON action.
+3. Keep context: if the user changes topic (e.g. asks an FAQ), answer, then return to scheduling.
+4. Ask a clarifying question when a request is ambiguous ("tomorrow afternoon").
+""").strip()
+
+# Conversation flow — changes only when the booking flow changes
+SYSTEM_FLOW: Final[str] = textwrap.dedent("""
+Flow:
+1. Greet and ask what brings them in.
+2. Use the [appointment_type] given with the message if present; otherwise ask which type they need. Then ask morning or afternoon.
+3. Given a date or time, request availability.
+4. Recommend 3-5 slots. If none work, suggest the closest alternatives; if none exist, offer the next available date.
+5. Once a slot is chosen, collect name, phone and email, then book.
+""").strip()
 
-2. Request availability:
-{
-  "action": "check_availability",
-  "date": "YYYY-MM-DD",
-  "appointment_type": "consultation|followup|physical|specialist"
+# Action formats, only needed by models without structured-output support
+ACTION_SCHEMA_DOC: Final[str] = textwrap.dedent("""
+Respond with exactly one of:
+{"action": "reply", "message": "..."}
+{"action": "check_availability", "date": "YYYY-MM-DD", "appointment_type": "consultation|followup|physical|specialist"}
+{"action": "book", "payload": {"appointment_type": "...", "date": "YYYY-MM-DD", "start_time": "HH:MM", "patient_name": "...", "patient_email": "...", "patient_phone": "...", "reason": "..."}}
+{"action": "faq", "question": "..."}
+""").strip()
+
+# Legacy single-string prompt
+SYSTEM_PROMPT: Final[str] = SYSTEM_STATIC + "\n\n" + SYSTEM_FLOW
+
+# FAQ answers phrased from retrieved clinic info (FAQ_LLM_ANSWERS=1)
+FAQ_PROMPT: Final[str] = textwrap.dedent("""
+You answer patient questions for HealthCare Plus Clinic.
+Use only the clinic information provided. If it doesn't cover the question, say so briefly.
+Answer in one to three sentences, in plain text.
+""").strip()
+
+
+# The constant system blocks. build_system_blocks() returns these same
+# objects every turn, so the LLM client can splice in their pre-encoded form.
+STATIC_BLOCK: Final[Dict[str, Any]] = {
+    "type": "text", "text": SYSTEM_STATIC, "cache_control": {"type": "ephemeral", "ttl": "1h"},
+}
+FLOW_BLOCK: Final[Dict[str, Any]] = {
+    "type": "text", "text": SYSTEM_FLOW, "cache_control": {"type": "ephemeral"},
 }
+SCHEMA_DOC_BLOCK: Final[Dict[str, Any]] = {
+    "type": "text", "text": ACTION_SCHEMA_DOC, "cache_control": {"type": "ephemeral"},
+}
+
+
+def build_system_blocks(dynamic_context: str = "", schema_doc: bool = False) -> List[Dict[str, Any]]:
+    """
+    Build system content blocks. The static and flow blocks are cached;
+    the per-turn dynamic context is appended uncached. schema_doc adds the
+    action formats for models without structured-output support.
+    """
+    blocks = [STATIC_BLOCK, FLOW_BLOCK]
+    if schema_doc:
+        blocks.append(SCHEMA_DOC_BLOCK)
+    if dynamic_context:
+        blocks.append({"type": "text", "text": dynamic_context})
+    return blocks
 
-3. Book appointment:
-{
-  "action": "book",
-  "payload": {
-      "appointment_type": "...",
-      "date": "YYYY-MM-DD",
-      "start_time": "HH:MM",
-      "patient_name": "...",
-      "patient_email": "...",
-      "patient_phone": "...",
-      "reason": "..."
-  }
+
+# Output actions, enforced by the provider via structured outputs instead of
+# being spelled out in the prompt
+ACTION_SCHEMA: Final[Dict[str, Any]] = {
+    "name": "agent_action",
+    # Strict mode constrains decoding, so every property is required and
+    # fields an action doesn't use are null
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "action": {"type": "string", "enum": ["reply", "check_availability", "book", "faq"]},
+            # reply
+            "message": {"type": ["string", "null"]},
+            # check_availability
+            "date": {"type": ["string", "null"], "description": "YYYY-MM-DD"},
+            "appointment_type": {
+                "type": ["string", "null"],
+                "enum": ["consultation", "followup", "physical", "specialist", None],
+            },
+            # book
+            "payload": {
+                "type": ["object", "null"],
+                "properties": {
+                    "appointment_type": {"type": "string"},
+                    "date": {"type": "string", "description": "YYYY-MM-DD"},
+                    "start_time": {"type": "string", "description": "HH:MM"},
+                    "patient_name": {"type": "string"},
+                    "patient_email": {"type": "string"},
+                    "patient_phone": {"type": "string"},
+                    "reason": {"type": "string"},
+                },
+                "required": [
+                    "appointment_type", "date", "start_time",
+                    "patient_name", "patient_email", "patient_phone", "reason",
+                ],
+                "additionalProperties": False,
+            },
+            # faq
+            "question": {"type": ["string", "null"]},
+        },
+        "required": ["action", "message", "date", "appointment_type", "payload", "question"],
+        "additionalProperties": False,
+    },
 }
 
-4. FAQ query:
-{
-  "action": "faq",
-  "question": "..."
+ACTION_RESPONSE_FORMAT: Final[Dict[str, Any]] = {"type": "json_schema", "json_schema": ACTION_SCHEMA}
+
+
+# Reason keyword -> appointment type, resolved in code before the LLM call
+SYMPTOM_MAP: Final[Dict[str, str]] = {
+    "headache": "consultation",
+    "checkup": "consultation",
+    "follow-up": "followup",
+    "follow up": "followup",
+    "followup": "followup",
+    "physical": "physical",
+    "specialist": "specialist",
 }
 
---------------------------------------
-CONVERSATION FLOW INSTRUCTIONS
---------------------------------------
-START:
-- greet warmly, ask: “What brings you in today?”
-
-IF USER TELLS SYMPTOM:
-- map symptom → appointment type
-  * headaches → general consultation (30min)
-  * routine checkup → general consultation
-  * follow-up → followup
-  * physical exam → physical
-  * specialist problem → specialist
-- then ask: “Do you prefer morning or afternoon?”
-
-IF USER GIVES DATE OR TIME:
-- build availability request JSON
-
-IF USER ASKS FAQ DURING BOOKING:
-- answer FAQ
-- then return: “Shall we continue scheduling your appointment?”
-
-IF USER LIKES A SLOT:
-- confirm details: name, phone, email
-- then call booking tool
-
-IF USER SAYS NONE OF THE SLOTS WORK:
-- suggest next 3–5 closest alternatives
-
-IF NO SLOTS AVAILABLE:
-- offer next available date or waitlist info
-
---------------------------------------
-TONE:
-- warm, human, professional, never robotic
---------------------------------------
-"""
+_SYMPTOM_RE = re.compile(r"\b(" + "|".join(map(re.escape, SYMPTOM_MAP)) + ")", re.IGNORECASE)
+
+
+def route_appointment_type(user_message: str) -> Optional[str]:
+    """Return the appointment type implied by the message, if any."""
+    match = _SYMPTOM_RE.search(user_message)
+    return SYMPTOM_MAP[match.group(1).lower()] if match else None
+
+
+def with_routing_context(user_message: str) -> str:
+    """Prefix the routed appointment type so the LLM doesn't have to infer it."""
+    appt_type = route_appointment_type(user_message)
+    if not appt_type:
+        return user_message
+    return f"[appointment_type: {appt_type}]\n{user_message}"
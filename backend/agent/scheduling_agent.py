@@ -1,14 +1,114 @@
-import json
+import logging
+import os
 import re
-from typing import Dict, Any, List
-from dateparser import parse
-import httpx
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+import orjson
+
+try:
+    import ahocorasick
+except ImportError:  # fall back to per-category regexes
+    ahocorasick = None
 
 from agent.llm import LLM
-from agent.prompts import SYSTEM_PROMPT
-from rag.faq_rag import FAQ_RAG
+from agent.prompts import FAQ_PROMPT, build_system_blocks, with_routing_context
+from agent.session_store import SessionStore
+from rag.faq_rag import FAQ_RAG, get_faq_rag
+from tools.availability_tool import AvailabilityTool
 from tools.booking_tool import BookingTool
 
+logger = logging.getLogger(__name__)
+
+# Precompiled patterns for the per-message parsing helpers
+_FAQ_RES = [
+    re.compile(r"\b(insurance|location|hours|parking|payment|policy|covid)\b"),  # Removed "cancel"
+    re.compile(r"\b(what|how|where|when)\b.*\b(cost|price|bring|documents)\b"),
+]
+_MEANINGFUL_RES = [
+    re.compile(r"\b(pain|hurt|sick|fever|cough|checkup|consultation|followup|exam)\b"),
+    re.compile(r"\b(need|want|schedule|book|appointment)\b"),
+]
+# Booking id (APPT-digits) anywhere in the message wins; otherwise the first
+# 6-character code. The \A branch only runs at position 0, so this is one pass.
+_CODE_RE = re.compile(r"\A.*?(APPT-\d+)|\b([A-Z0-9]{6})\b", re.IGNORECASE | re.DOTALL)
+_DIGIT1_9_RE = re.compile(r"\b([1-9])\b")
+_NON_DIGIT_RE = re.compile(r"\D")
+_EMAIL_RE = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+# Common date phrasings handled without dateparser
+_WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
+    "friday": 4, "saturday": 5, "sunday": 6,
+}
+_IN_DAYS_RE = re.compile(r"^in (\d+) days?$")
+_WEEKDAY_RE = re.compile(r"^(?:next |this )?(" + "|".join(_WEEKDAYS) + ")$")
+_DATE_FORMATS = ("%Y-%m-%d", "%B %d", "%b %d")
+
+# Intent keywords by category, matched as substrings in a single pass
+_KEYWORDS = {
+    "cancel": ["cancel"],
+    "restart": ["restart", "start over"],
+    "yes": ["yes"],
+    "confirm": ["yes", "confirm", "book"],
+    "symptom": [
+        "pain", "hurt", "injury", "fever", "cough",
+        "sick", "ache", "throat", "rash", "headache",
+    ],
+    "booking": ["appointment", "book", "schedule", "visit", "see doctor", "consultation"],
+    "urgent": ["urgent", "severe", "emergency", "bad", "terrible", "can't", "unable"],
+}
+
+# One alternation per category, same substring semantics as the automaton
+_KEYWORD_RES = {
+    category: re.compile("|".join(map(re.escape, words)))
+    for category, words in _KEYWORDS.items()
+}
+
+# Accepting a suggestion — whole words only, so "y" doesn't match "why"
+_YES_SET = frozenset({"yes", "y", "ok", "okay", "sure", "fine", "perfect"})
+_YES_PHRASES = ("sounds good",)
+
+_GREETINGS = frozenset({"hi", "hello", "hey", "good morning", "good afternoon", "good evening"})
+_FILLER_GREETINGS = frozenset({"hi", "hello", "hey", "yo", "sup"})
+
+
+@lru_cache(maxsize=1024)
+def _fast_parse_date(t: str, today_ordinal: int) -> Optional[str]:
+    """
+    Resolve today / tomorrow / in N days / [next] <weekday> / ISO / "March 5"
+    relative to the given day. Returns None when dateparser is needed.
+    """
+    today = date.fromordinal(today_ordinal)
+
+    if t == "today":
+        return today.isoformat()
+    if t == "tomorrow":
+        return (today + timedelta(days=1)).isoformat()
+
+    match = _IN_DAYS_RE.match(t)
+    if match:
+        return (today + timedelta(days=int(match.group(1)))).isoformat()
+
+    match = _WEEKDAY_RE.match(t)
+    if match:
+        days_ahead = (_WEEKDAYS[match.group(1)] - today.weekday()) % 7 or 7
+        return (today + timedelta(days=days_ahead)).isoformat()
+
+    for fmt in _DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(t, fmt)
+        except ValueError:
+            continue
+        if fmt != "%Y-%m-%d":
+            parsed = parsed.replace(year=today.year)
+        return parsed.strftime("%Y-%m-%d")
+
+    return None
+
 
 class SchedulingAgent:
     """
@@ -25,40 +125,52 @@ class SchedulingAgent:
         "specialist": {"duration": 60, "name": "Specialist Consultation"},
     }
 
-    FAQ_PATTERNS = [
-        r"\b(insurance|location|hours|parking|payment|policy|covid)\b",  # Removed "cancel"
-        r"\b(what|how|where|when)\b.*\b(cost|price|bring|documents)\b",
-    ]
-
-    symptoms = [
-        "pain",
-        "hurt",
-        "injury",
-        "fever",
-        "cough",
-        "sick",
-        "ache",
-        "throat",
-        "rash",
-        "headache",
-    ]
-
-    illness_triggers = [
-        "doctor",
-        "clinic",
-        "appointment",
-        "book",
-        "medical",
-        "hospital",
-        "checkup",
-        "consult",
-    ]
+    CANCEL_STATES = frozenset({
+        "awaiting_cancel_confirm",
+        "awaiting_cancellation_code",
+        "awaiting_cancel_code_confirm",
+    })
 
     def __init__(self):
         self.llm = LLM()
-        self.rag = FAQ_RAG()
+        self._rag: Optional[FAQ_RAG] = None  # built on the first FAQ question
         self.booking_tool = BookingTool()
-        self.session_memory = {}
+        self.availability = AvailabilityTool()
+        self.sessions = SessionStore()
+
+        # State -> handler; each takes (text, text_l, tags, memory)
+        self._handlers = {
+            None: self._initial,
+            "awaiting_cancel_confirm": self._h_cancel_confirm,
+            "awaiting_cancellation_code": self._h_cancellation_code,
+            "awaiting_cancel_code_confirm": self._h_cancel_code_confirm,
+            "awaiting_reason": self._h_reason,
+            "awaiting_appointment_type": self._h_appointment_type,
+            "awaiting_date": self._h_date,
+            "awaiting_time": self._h_time,
+            "awaiting_doctor": self._h_doctor,
+            "awaiting_slot": self._h_slot,
+            "awaiting_name": self._h_name,
+            "awaiting_phone": self._h_phone,
+            "awaiting_email": self._h_email,
+            "awaiting_confirm": self._h_confirm,
+        }
+
+        # Phrase FAQ answers with the LLM instead of returning the raw entry
+        self.faq_llm_answers = os.getenv("FAQ_LLM_ANSWERS", "0") == "1"
+
+        # One automaton over every intent keyword; payload = categories of that word
+        self.kw = None
+        if ahocorasick is not None:
+            categories: Dict[str, set] = {}
+            for category, words in _KEYWORDS.items():
+                for word in words:
+                    categories.setdefault(word, set()).add(category)
+
+            self.kw = ahocorasick.Automaton()
+            for word, cats in categories.items():
+                self.kw.add_word(word, frozenset(cats))
+            self.kw.make_automaton()
 
     # =====================================================
     # MAIN CHAT HANDLER
@@ -66,16 +178,16 @@ class SchedulingAgent:
     async def handle_message(
         self, user_message: str, session_id: str
     ) -> Dict[str, Any]:
+        async with self.sessions.session(session_id, self._new_session_state) as memory:
+            return await self._respond(user_message, memory)
+
+    async def _respond(self, user_message: str, memory: Dict) -> Dict[str, Any]:
         text = user_message.strip()
         text_l = text.lower()
-
-        if session_id not in self.session_memory:
-            self.session_memory[session_id] = self._new_session_state()
-
-        memory = self.session_memory[session_id]
+        tags = self._tag(text_l)
 
         # Check for cancellation intent FIRST (before FAQ)
-        if "cancel" in text_l:
+        if "cancel" in tags:
             # if user already has a booking in memory
             if memory.get("last_booking_id"):
                 memory["state"] = "awaiting_cancel_confirm"
@@ -93,276 +205,300 @@ class SchedulingAgent:
 
         # FAQ detection (after cancellation check)
         if self._is_faq(text_l):
-            return self._handle_faq(memory, text)
-
-        if memory["state"] == "awaiting_cancel_confirm":
-            if "yes" in text_l:
-                try:
-                    result = self.booking_tool.cancel(memory["last_booking_id"])
-                    memory["state"] = None
-                    memory["last_booking_id"] = None
-                    return self._msg(
-                        "❌ Your appointment has been cancelled.\n\n"
-                        "If you'd like to book again, I can help."
-                    )
-                except Exception as e:
-                    return self._msg(f"❌ Could not cancel: {e}")
-
-            # user said NO
-            memory["state"] = None
-            return self._msg("👍 Okay, I will keep your appointment.")
+            return await self._handle_faq(memory, text)
 
-        # Handle cancellation code input
-        if memory["state"] == "awaiting_cancellation_code":
-            code = self._parse_confirmation_code(text)
-            if not code:
-                return self._msg(
-                    "I couldn't detect a valid code.\n"
-                    "Please provide something like:\n"
-                    "• APPT-123456\n• ABC123"
-                )
+        state = memory["state"]
 
-            booking = self.booking_tool.get_booking_by_confirmation(code)
-            if not booking:
+        # Reset conversation (a pending cancel question is answered first)
+        if "restart" in tags and state not in self.CANCEL_STATES:
+            memory.clear()
+            memory.update(self._new_session_state())
+            return self._msg("Got it, let's start fresh. What brings you in today?")
+
+        # Current step of the flow (None = first interaction)
+        handler = self._handlers.get(state)
+        if handler:
+            return await handler(text, text_l, tags, memory)
+
+        # Fallback to LLM
+        try:
+            system = build_system_blocks(
+                self._turn_context(memory),
+                schema_doc=not self.llm.structured_outputs,
+            )
+            llm_out = await self.llm.respond(system, with_routing_context(user_message))
+            parsed = orjson.loads(llm_out)
+            return {
+                "action": "reply",
+                "message": parsed.get("message") or "I didn't understand that.",
+            }
+        except:
+            return self._msg("Sorry, I didn't understand that 🙏\nCould you rephrase?")
+
+    # =====================================================
+    # STATE HANDLERS
+    # =====================================================
+    async def _h_cancel_confirm(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """Confirm cancelling the booking made in this session"""
+        if "yes" in tags:
+            try:
+                result = await self.booking_tool.cancel(memory["last_booking_id"])
+                memory["state"] = None
+                memory["last_booking_id"] = None
                 return self._msg(
-                    "❌ I couldn't find an active appointment with that code.\n"
-                    "Please check your confirmation email."
+                    "❌ Your appointment has been cancelled.\n\n"
+                    "If you'd like to book again, I can help."
                 )
+            except Exception as e:
+                return self._msg(f"❌ Could not cancel: {e}")
 
-            # Save which booking user wants to cancel
-            memory["cancel_target"] = booking
-            memory["state"] = "awaiting_cancel_code_confirm"
+        # user said NO
+        memory["state"] = None
+        return self._msg("👍 Okay, I will keep your appointment.")
+
+    async def _h_cancellation_code(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """Handle cancellation code input"""
+        code = self._parse_confirmation_code(text)
+        if not code:
             return self._msg(
-                f"📋 Found your appointment:\n\n"
-                f"📅 {booking.get('date')} at {booking.get('start_time')}\n"
-                f"👨‍⚕️ {booking.get('doctor_name', 'Doctor')}\n\n"
-                f"Are you sure you want to cancel? (yes/no)"
+                "I couldn't detect a valid code.\n"
+                "Please provide something like:\n"
+                "• APPT-123456\n• ABC123"
             )
 
-        if memory["state"] == "awaiting_cancel_code_confirm":
-            if "yes" in text_l:
-                booking = memory["cancel_target"]
-                result = self.booking_tool.cancel(booking["booking_id"])
-                memory["cancel_target"] = None
-                memory["last_booking_id"] = None
-                memory["state"] = None
+        booking = await self.booking_tool.get_booking_by_confirmation(code)
+        if not booking:
+            return self._msg(
+                "❌ I couldn't find an active appointment with that code.\n"
+                "Please check your confirmation email."
+            )
 
-                return self._msg(
-                    "❌ Appointment cancelled successfully.\n"
-                    "If you'd like to rebook, just let me know!"
-                )
+        # Save which booking user wants to cancel
+        memory["cancel_target"] = booking
+        memory["state"] = "awaiting_cancel_code_confirm"
+        return self._msg(
+            f"📋 Found your appointment:\n\n"
+            f"📅 {booking.get('date')} at {booking.get('start_time')}\n"
+            f"👨‍⚕️ {booking.get('doctor_name', 'Doctor')}\n\n"
+            f"Are you sure you want to cancel? (yes/no)"
+        )
 
-            memory["state"] = None
+    async def _h_cancel_code_confirm(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """Confirm cancelling the booking found by code"""
+        if "yes" in tags:
+            booking = memory["cancel_target"]
+            result = await self.booking_tool.cancel(booking["booking_id"])
             memory["cancel_target"] = None
-            return self._msg("👍 Ok, I will keep your appointment.")
+            memory["last_booking_id"] = None
+            memory["state"] = None
 
-        # Reset conversation
-        if "restart" in text_l or "start over" in text_l:
-            self.session_memory[session_id] = self._new_session_state()
-            return self._msg("Got it, let's start fresh. What brings you in today?")
+            return self._msg(
+                "❌ Appointment cancelled successfully.\n"
+                "If you'd like to rebook, just let me know!"
+            )
 
-        # First interaction
-        if memory["state"] is None:
-            return await self._initial(text, text_l, memory)
+        memory["state"] = None
+        memory["cancel_target"] = None
+        return self._msg("👍 Ok, I will keep your appointment.")
 
-        # 1️⃣ Capture Reason
-        if memory["state"] == "awaiting_reason":
-            # Validate: Check if user provided actual information
-            if not self._is_valid_reason(text):
-                return self._msg(
-                    "I'd like to help! Could you tell me what brings you in?\n\n"
-                    "For example:\n"
-                    "• 'I have a headache'\n"
-                    "• 'I need a checkup'\n"
-                    "• 'Follow-up appointment'"
-                )
-            
-            memory["reason"] = text
-            memory["state"] = "awaiting_appointment_type"
-            return self._suggest_appt_type(text)
-
-        # 2️⃣ Appointment type
-        if memory["state"] == "awaiting_appointment_type":
-            # Allow "yes" to accept suggested type
-            if any(
-                word in text_l
-                for word in ["yes", "y", "ok", "okay", "sure", "sounds good", "fine", "perfect"]
-            ):
-                apt_type = "consultation"  # Default suggested type
-            else:
-                apt_type = self._parse_appt_type(text_l)
-
-            if not apt_type:
-                return self._ask_appt_type()
-
-            memory["appointment_type"] = apt_type
-            memory["state"] = "awaiting_date"
-
-            info = self.APPOINTMENT_TYPES[apt_type]
+    async def _h_reason(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """1️⃣ Capture Reason"""
+        # Validate: Check if user provided actual information
+        if not self._is_valid_reason(text, text_l):
             return self._msg(
-                f"Great! I'll schedule a **{info['name']}** ({info['duration']}m).\n\n"
-                f"When would you like to come in?\n"
-                f"Try:\n• tomorrow\n• next Monday\n• March 5\n• in 2 days"
+                "I'd like to help! Could you tell me what brings you in?\n\n"
+                "For example:\n"
+                "• 'I have a headache'\n"
+                "• 'I need a checkup'\n"
+                "• 'Follow-up appointment'"
             )
 
-        # 3️⃣ Date
-        if memory["state"] == "awaiting_date":
-            normalized = self._parse_date(text)
-            if not normalized:
-                return self._msg(
-                    "I didn't understand that date. Please try:\n"
-                    "• tomorrow\n"
-                    "• next Monday\n"
-                    "• December 15\n"
-                    "• in 3 days"
-                )
+        memory["reason"] = text
+        memory["state"] = "awaiting_appointment_type"
+        return self._suggest_appt_type(tags)
 
-            memory["preferred_date"] = normalized
-            memory["state"] = "awaiting_time"
-            return self._msg("Got it! Morning ☀️ Afternoon 🌤️ or Evening 🌙 ?")
+    async def _h_appointment_type(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """2️⃣ Appointment type"""
+        # Allow "yes" to accept suggested type
+        if self._is_accept(text_l):
+            apt_type = "consultation"  # Default suggested type
+        else:
+            apt_type = self._parse_appt_type(text_l)
 
-        # 4️⃣ Time preference → Doctor list
-        if memory["state"] == "awaiting_time":
-            time_pref = self._parse_time(text_l)
-            if not time_pref:
-                return self._msg(
-                    "Please choose a time of day:\n"
-                    "• Morning ☀️\n"
-                    "• Afternoon 🌤️\n"
-                    "• Evening 🌙"
-                )
+        if not apt_type:
+            return self._ask_appt_type()
 
-            memory["preferred_time_of_day"] = time_pref
+        memory["appointment_type"] = apt_type
+        memory["state"] = "awaiting_date"
 
-            doctors = await self._fetch_doctors(memory)
-            if not doctors:
-                return self._msg(
-                    "No doctors available for that time. Try a different time or date."
-                )
+        info = self.APPOINTMENT_TYPES[apt_type]
+        return self._msg(
+            f"Great! I'll schedule a **{info['name']}** ({info['duration']}m).\n\n"
+            f"When would you like to come in?\n"
+            f"Try:\n• tomorrow\n• next Monday\n• March 5\n• in 2 days"
+        )
 
-            memory["doctors"] = doctors
-            memory["state"] = "awaiting_doctor"
-            return {
-                "action": "doctors",
-                "message": "Here are available doctors 👇",
-                "doctors": doctors,
-            }
+    async def _h_date(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """3️⃣ Date"""
+        normalized = self._parse_date(text)
+        if not normalized:
+            return self._msg(
+                "I didn't understand that date. Please try:\n"
+                "• tomorrow\n"
+                "• next Monday\n"
+                "• December 15\n"
+                "• in 3 days"
+            )
 
-        # 5️⃣ Doctor selection → Fetch slots
-        if memory["state"] == "awaiting_doctor":
-            selected = self._pick_doctor(text, memory["doctors"])
-            if not selected:
-                return self._msg(
-                    "Please select a doctor by saying:\n"
-                    "• first\n"
-                    "• second\n"
-                    "• 1 or 2\n"
-                    "• Dr. Smith"
-                )
+        memory["preferred_date"] = normalized
+        memory["state"] = "awaiting_time"
+        return self._msg("Got it! Morning ☀️ Afternoon 🌤️ or Evening 🌙 ?")
+
+    async def _h_time(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """4️⃣ Time preference → Doctor list"""
+        time_pref = self._parse_time(text_l)
+        if not time_pref:
+            return self._msg(
+                "Please choose a time of day:\n"
+                "• Morning ☀️\n"
+                "• Afternoon 🌤️\n"
+                "• Evening 🌙"
+            )
 
-            memory["doctor"] = selected
+        memory["preferred_time_of_day"] = time_pref
 
+        doctors = await self._fetch_doctors(memory)
+        if not doctors:
+            return self._msg(
+                "No doctors available for that time. Try a different time or date."
+            )
+
+        # Only what _pick_doctor needs — the display list goes back to the UI
+        memory["doctors"] = [{"doctor_id": d["doctor_id"], "name": d["name"]} for d in doctors]
+        memory["state"] = "awaiting_doctor"
+        return {
+            "action": "doctors",
+            "message": "Here are available doctors 👇",
+            "doctors": doctors,
+        }
+
+    async def _h_doctor(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """5️⃣ Doctor selection → Fetch slots"""
+        selected = self._pick_doctor(text_l, memory["doctors"])
+        if not selected:
+            return self._msg(
+                "Please select a doctor by saying:\n"
+                "• first\n"
+                "• second\n"
+                "• 1 or 2\n"
+                "• Dr. Smith"
+            )
+
+        memory["doctor"] = selected
+
+        # Top doctor's start times were kept when the doctor list was built;
+        # display rows are then built only for the slots shown
+        prefetched = memory.get("prefetched_slots")
+        memory["prefetched_slots"] = None
+        if prefetched and prefetched["doctor_id"] == selected["doctor_id"]:
+            start_times = prefetched["slots"]
+            shown = self.availability.slots_at(
+                memory["preferred_date"], selected["doctor_id"], start_times[:8]
+            )
+        else:
             slots = await self._fetch_slots(memory)
-            if not slots:
-                return self._msg(
-                    "No slots available with this doctor. Try another date."
-                )
+            start_times = [s.start_time for s in slots]
+            shown = slots[:8]
 
-            memory["available_slots"] = slots
-            memory["state"] = "awaiting_slot"
-            return {
-                "action": "slots",
-                "message": f"📅 Available times with **{selected['name']}**:",
-                "slots": slots[:8],
-            }
+        if not start_times:
+            return self._msg(
+                "No slots available with this doctor. Try another date."
+            )
 
-        # 6️⃣ Slot selection
-        if memory["state"] == "awaiting_slot":
-            choice = self._pick_slot(text, memory["available_slots"])
-            if not choice:
-                return self._msg(
-                    "Please select a time slot:\n"
-                    "• 10:30\n"
-                    "• first or earliest\n"
-                    "• 1, 2, 3..."
-                )
+        memory["available_slots"] = start_times
+        memory["state"] = "awaiting_slot"
+        return {
+            "action": "slots",
+            "message": f"📅 Available times with **{selected['name']}**:",
+            "slots": [s._asdict() for s in shown],
+        }
 
-            memory["selected_slot"] = choice
-            memory["state"] = "awaiting_name"
-            return self._msg("Perfect 👍 What's your full name?")
+    async def _h_slot(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """6️⃣ Slot selection"""
+        choice = self._pick_slot(text_l, memory["available_slots"])
+        if not choice:
+            return self._msg(
+                "Please select a time slot:\n"
+                "• 10:30\n"
+                "• first or earliest\n"
+                "• 1, 2, 3..."
+            )
 
-        # 7️⃣ Name
-        if memory["state"] == "awaiting_name":
-            if len(text.split()) < 2:
-                return self._msg(
-                    "Please provide your full name (first and last name).\n"
-                    "Example: John Smith"
-                )
-            memory["patient"]["name"] = text
-            memory["state"] = "awaiting_phone"
-            return self._msg("Great! What's your phone number?")
+        memory["selected_slot"] = choice
+        memory["state"] = "awaiting_name"
+        return self._msg("Perfect 👍 What's your full name?")
 
-        # 8️⃣ Phone
-        if memory["state"] == "awaiting_phone":
-            if not self._valid_phone(text):
-                return self._msg(
-                    "That doesn't look like a valid phone number.\n"
-                    "Please provide a 10-digit phone number.\n"
-                    "Example: 555-123-4567"
-                )
-            memory["patient"]["phone"] = text
-            memory["state"] = "awaiting_email"
-            return self._msg("And your email address?")
+    async def _h_name(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """7️⃣ Name"""
+        if len(text.split()) < 2:
+            return self._msg(
+                "Please provide your full name (first and last name).\n"
+                "Example: John Smith"
+            )
+        memory["patient"]["name"] = text
+        memory["state"] = "awaiting_phone"
+        return self._msg("Great! What's your phone number?")
 
-        # 9️⃣ Email
-        if memory["state"] == "awaiting_email":
-            if not self._valid_email(text):
-                return self._msg(
-                    "That email looks invalid. Please try again.\n"
-                    "Example: john@example.com"
-                )
-            memory["patient"]["email"] = text
-            memory["state"] = "awaiting_confirm"
-            return self._msg(self._summary(memory) + "\n\n✅ Confirm? (yes/no)")
-
-        # 🔟 Confirm booking
-        if memory["state"] == "awaiting_confirm":
-            if "yes" in text_l or "confirm" in text_l or "book" in text_l:
-                try:
-                    result = self._book(memory)
-                    memory["state"] = "completed"
-                    memory["last_booking_id"] = result[
-                        "booking_id"
-                    ]  # Store for potential cancellation
-                    return {
-                        "action": "booking_confirmed",
-                        "details": result,
-                        "message": (
-                            f"🎉 **Appointment confirmed!**\n\n"
-                            f"📅 {memory['preferred_date']} at {memory['selected_slot']}\n"
-                            f"👨‍⚕️ {memory['doctor']['name']}\n"
-                            f"🔖 Confirmation: **{result['confirmation_code']}**\n\n"
-                            f"See you then! 👋"
-                        ),
-                    }
-                except Exception as e:
-                    return self._msg(f"❌ Booking failed: {str(e)}\nPlease try again.")
-
-            # User wants to change something
+    async def _h_phone(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """8️⃣ Phone"""
+        if not self._valid_phone(text):
             return self._msg(
-                "No problem! What would you like to change?\n(date, time, doctor, or cancel)"
+                "That doesn't look like a valid phone number.\n"
+                "Please provide a 10-digit phone number.\n"
+                "Example: 555-123-4567"
             )
+        memory["patient"]["phone"] = text
+        memory["state"] = "awaiting_email"
+        return self._msg("And your email address?")
 
-        # Fallback to LLM
-        try:
-            llm_out = await self.llm.respond(SYSTEM_PROMPT, user_message)
-            parsed = json.loads(llm_out)
-            return {
-                "action": "reply",
-                "message": parsed.get("message", "I didn't understand that."),
-            }
-        except:
-            return self._msg("Sorry, I didn't understand that 🙏\nCould you rephrase?")
+    async def _h_email(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """9️⃣ Email"""
+        if not self._valid_email(text):
+            return self._msg(
+                "That email looks invalid. Please try again.\n"
+                "Example: john@example.com"
+            )
+        memory["patient"]["email"] = text
+        memory["state"] = "awaiting_confirm"
+        return self._msg(self._summary(memory) + "\n\n✅ Confirm? (yes/no)")
+
+    async def _h_confirm(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
+        """🔟 Confirm booking"""
+        if "confirm" in tags:
+            try:
+                result = await self._book(memory)
+                memory["state"] = "completed"
+                memory["last_booking_id"] = result[
+                    "booking_id"
+                ]  # Store for potential cancellation
+                return {
+                    "action": "booking_confirmed",
+                    "details": result,
+                    "message": (
+                        f"🎉 **Appointment confirmed!**\n\n"
+                        f"📅 {memory['preferred_date']} at {memory['selected_slot']}\n"
+                        f"👨‍⚕️ {memory['doctor']['name']}\n"
+                        f"🔖 Confirmation: **{result['confirmation_code']}**\n\n"
+                        f"See you then! 👋"
+                    ),
+                }
+            except Exception as e:
+                return self._msg(f"❌ Booking failed: {str(e)}\nPlease try again.")
+
+        # User wants to change something
+        return self._msg(
+            "No problem! What would you like to change?\n(date, time, doctor, or cancel)"
+        )
 
     # =====================================================
     # SESSION STATE
@@ -379,6 +515,7 @@ class SchedulingAgent:
             "patient": {},
             "doctors": [],
             "available_slots": [],
+            "prefetched_slots": None,
             "last_booking_id": None,
             "cancel_target": None,
         }
@@ -386,22 +523,15 @@ class SchedulingAgent:
     # =====================================================
     # INITIAL MESSAGE HANDLING
     # =====================================================
-    async def _initial(self, text: str, text_l: str, memory: Dict) -> Dict[str, Any]:
+    async def _initial(self, text: str, text_l: str, tags: frozenset, memory: Dict) -> Dict[str, Any]:
         """Handle the first user message"""
 
         # Greeting detection - don't advance state yet
-        greetings = [
-            "hi",
-            "hello",
-            "hey",
-            "good morning",
-            "good afternoon",
-            "good evening",
-        ]
-        
         # Check if message is ONLY a greeting (no additional info)
-        is_pure_greeting = any(text_l.strip() == g or text_l.strip() == g + "!" for g in greetings)
-        
+        is_pure_greeting = text_l in _GREETINGS or (
+            text_l.endswith("!") and text_l[:-1] in _GREETINGS
+        )
+
         if is_pure_greeting:
             memory["state"] = "awaiting_reason"
             return self._msg(
@@ -410,19 +540,7 @@ class SchedulingAgent:
             )
 
         # Symptom detection - auto-store as reason
-        symptoms = [
-            "pain",
-            "hurt",
-            "injury",
-            "fever",
-            "cough",
-            "sick",
-            "ache",
-            "throat",
-            "rash",
-            "headache",
-        ]
-        if any(s in text_l for s in symptoms):
+        if "symptom" in tags:
             memory["reason"] = text
             memory["state"] = "awaiting_appointment_type"
             return self._msg(
@@ -432,15 +550,7 @@ class SchedulingAgent:
             )
 
         # Booking intent keywords
-        booking_words = [
-            "appointment",
-            "book",
-            "schedule",
-            "visit",
-            "see doctor",
-            "consultation",
-        ]
-        if any(w in text_l for w in booking_words):
+        if "booking" in tags:
             memory["state"] = "awaiting_reason"
             return self._msg("Sure! What's the reason for your appointment?")
 
@@ -454,13 +564,10 @@ class SchedulingAgent:
     # =====================================================
     # VALIDATION HELPERS
     # =====================================================
-    def _is_valid_reason(self, text: str) -> bool:
+    def _is_valid_reason(self, text: str, text_l: str) -> bool:
         """Check if user provided a valid reason (not just greeting/filler)"""
-        text_l = text.lower().strip()
-        
         # Filter out pure greetings
-        greetings = ["hi", "hello", "hey", "yo", "sup"]
-        if text_l in greetings:
+        if text_l in _FILLER_GREETINGS:
             return False
         
         # Must be at least 3 characters and contain meaningful content
@@ -468,19 +575,18 @@ class SchedulingAgent:
             return False
         
         # Check for meaningful words
-        meaningful_patterns = [
-            r'\b(pain|hurt|sick|fever|cough|checkup|consultation|followup|exam)\b',
-            r'\b(need|want|schedule|book|appointment)\b',
-        ]
-        
-        return any(re.search(pattern, text_l) for pattern in meaningful_patterns) or len(text.split()) >= 3
+        return any(p.search(text_l) for p in _MEANINGFUL_RES) or len(text.split()) >= 3
 
     # =====================================================
     # FAQ HANDLING
     # =====================================================
-    def _handle_faq(self, memory: Dict, question: str) -> Dict[str, Any]:
+    async def _handle_faq(self, memory: Dict, question: str) -> Dict[str, Any]:
         """Handle FAQ questions using RAG"""
-        answer = self.rag.query(question)
+        norm = _SPACES_RE.sub(" ", _PUNCT_RE.sub("", question.lower())).strip()
+        if self.faq_llm_answers:
+            answer = await self.rag.query_with_llm(norm, self.llm, FAQ_PROMPT)
+        else:
+            answer = self.rag.query(norm)  # repeats hit the RAG's exact-match cache
 
         # If user is mid-booking, guide them back
         if memory["state"] and memory["state"] not in ["completed", None]:
@@ -489,6 +595,13 @@ class SchedulingAgent:
         # Otherwise, offer to book
         return self._msg(answer + "\n\nWould you like to schedule an appointment?")
 
+    @property
+    def rag(self) -> FAQ_RAG:
+        """FAQ index — embedding every clinic FAQ is slow, so defer it until needed"""
+        if self._rag is None:
+            self._rag = get_faq_rag()
+        return self._rag
+
     def _get_return_prompt(self, memory: Dict) -> str:
         """Get contextual prompt to continue booking"""
         prompts = {
@@ -508,13 +621,10 @@ class SchedulingAgent:
     # =====================================================
     # APPOINTMENT TYPE HELPERS
     # =====================================================
-    def _suggest_appt_type(self, reason: str) -> Dict[str, Any]:
-        """Suggest appointment type based on reason"""
-        r = reason.lower()
-
+    def _suggest_appt_type(self, tags: frozenset) -> Dict[str, Any]:
+        """Suggest appointment type based on the reason's keyword tags"""
         # Check for urgency indicators
-        urgent = ["urgent", "severe", "emergency", "bad", "terrible", "can't", "unable"]
-        if any(word in r for word in urgent):
+        if "urgent" in tags:
             return self._msg(
                 "That sounds urgent 😟\n\n"
                 "I recommend a **General Consultation (30 min)**.\n"
@@ -532,46 +642,43 @@ class SchedulingAgent:
     # API CALLS
     # =====================================================
     async def _fetch_doctors(self, mem):
+        """
+        Fetch doctors for the chosen date/type. The same availability pass
+        already has every doctor's slots, so keep the top doctor's start
+        times in memory for when the user picks the first suggestion.
+        """
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    "http://localhost:8000/api/calendly/doctors",
-                    params={
-                        "date": mem["preferred_date"],
-                        "appointment_type": mem["appointment_type"],
-                    },
-                    timeout=10,
-                )
-            resp.raise_for_status()
-            return resp.json().get("doctors", [])
-
-        except Exception as e:
-            print(f"❌ Error fetching doctors: {e}")
+            slots = self.availability.check(mem["preferred_date"], mem["appointment_type"])
+            doctors = self.availability.doctors_from_slots(slots)
+
+            if doctors:
+                top_id = doctors[0]["doctor_id"]
+                mem["prefetched_slots"] = {
+                    "doctor_id": top_id,
+                    "slots": [s.start_time for s in slots if s.doctor_id == top_id],
+                }
+            return doctors
+
+        except Exception:
+            logger.exception("Error fetching doctors")
             return []
 
     async def _fetch_slots(self, mem):
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    "http://localhost:8000/api/calendly/availability",
-                    params={
-                        "date": mem["preferred_date"],
-                        "appointment_type": mem["appointment_type"],
-                        "doctor_id": mem["doctor"]["doctor_id"],
-                    },
-                    timeout=10,
-                )
-            resp.raise_for_status()
-            return resp.json().get("available_slots", [])
+            return self.availability.check(
+                mem["preferred_date"],
+                mem["appointment_type"],
+                doctor_id=mem["doctor"]["doctor_id"],
+            )
 
-        except Exception as e:
-            print(f"❌ Error fetching slots: {e}")
+        except Exception:
+            logger.exception("Error fetching slots")
             return []
 
     # =====================================================
     # BOOKING
     # =====================================================
-    def _book(self, mem):
+    async def _book(self, mem):
         payload = {
             "doctor_id": mem["doctor"]["doctor_id"],
             "appointment_type": mem["appointment_type"],
@@ -582,30 +689,50 @@ class SchedulingAgent:
             "patient_phone": mem["patient"]["phone"],
             "reason": mem["reason"],
         }
-        return self.booking_tool.book(payload)
+        booking = await self.booking_tool.book(payload)
+        return booking
 
     # =====================================================
     # PARSING HELPERS
     # =====================================================
+    def _tag(self, text_l: str) -> frozenset:
+        """Keyword categories present in the (lowercased) message"""
+        if self.kw is None:
+            return frozenset(cat for cat, pattern in _KEYWORD_RES.items() if pattern.search(text_l))
+
+        tags = set()
+        for _, cats in self.kw.iter(text_l):
+            tags |= cats
+        return frozenset(tags)
+
+    @staticmethod
+    def _turn_context(memory: Dict) -> str:
+        """Per-turn facts for the uncached system block"""
+        lines = [f"Today is {date.today():%A, %Y-%m-%d}."]
+        if memory.get("state"):
+            lines.append(f"Current step: {memory['state']}.")
+        if memory.get("appointment_type"):
+            lines.append(f"Appointment type so far: {memory['appointment_type']}.")
+        return "\n".join(lines)
+
     def _msg(self, text: str) -> Dict[str, Any]:
         """Helper to create reply action"""
         return {"action": "reply", "message": text}
 
+    def _is_accept(self, text_l: str) -> bool:
+        """Check if the (lowercased) message accepts a suggestion"""
+        tokens = set(_PUNCT_RE.sub(" ", text_l).split())
+        return bool(tokens & _YES_SET) or any(p in text_l for p in _YES_PHRASES)
+
     def _is_faq(self, text: str) -> bool:
         """Check if message is an FAQ question"""
-        return any(re.search(pattern, text) for pattern in self.FAQ_PATTERNS)
+        return any(p.search(text) for p in _FAQ_RES)
 
     def _parse_confirmation_code(self, text: str) -> str:
         """Extract confirmation code from user input"""
-        # Look for pattern like APPT-123456
-        match = re.search(r"APPT-\d+", text.upper())
-        if match:
-            return match.group()
-
-        # Look for 6-character alphanumeric code
-        match = re.search(r"\b([A-Z0-9]{6})\b", text.upper())
+        match = _CODE_RE.search(text)
         if match:
-            return match.group()
+            return (match.group(1) or match.group(2)).upper()
 
         return None
 
@@ -647,13 +774,18 @@ class SchedulingAgent:
 
     def _parse_date(self, user_input: str) -> str:
         """Parse natural language date to YYYY-MM-DD"""
+        fast = _fast_parse_date(user_input.strip().lower(), date.today().toordinal())
+        if fast:
+            return fast
+
+        # Rare phrasings — dateparser is slow to load, so import on demand
+        from dateparser import parse
+
         parsed = parse(user_input)
         return parsed.strftime("%Y-%m-%d") if parsed else None
 
-    def _pick_doctor(self, text: str, doctors: List[Dict]) -> Dict:
-        """Select doctor from list based on user input"""
-        t = text.lower()
-
+    def _pick_doctor(self, t: str, doctors: List[Dict]) -> Dict:
+        """Select doctor from list based on (lowercased) user input"""
         # Ordinal words
         ordinals = {"first": 0, "second": 1, "third": 2, "1st": 0, "2nd": 1, "3rd": 2}
         for word, idx in ordinals.items():
@@ -661,7 +793,7 @@ class SchedulingAgent:
                 return doctors[idx]
 
         # Number matching
-        match = re.search(r"\b([1-9])\b", t)
+        match = _DIGIT1_9_RE.search(t)
         if match:
             idx = int(match.group()) - 1
             if 0 <= idx < len(doctors):
@@ -674,42 +806,40 @@ class SchedulingAgent:
 
         return None
 
-    def _pick_slot(self, text: str, slots: List[Dict]) -> str:
-        """Select slot from list based on user input"""
-        t = text.lower()
-
+    def _pick_slot(self, t: str, slots: List[str]) -> str:
+        """Select a start time from the offered slots based on (lowercased) user input"""
         # Special keywords
         if "earliest" in t or "first available" in t:
-            return slots[0]["start_time"]
+            return slots[0]
         if "latest" in t or "last" in t:
-            return slots[-1]["start_time"]
+            return slots[-1]
 
         # Exact time match
-        for slot in slots:
-            if slot["start_time"] in text:
-                return slot["start_time"]
+        for start_time in slots:
+            if start_time in t:
+                return start_time
 
         # Number selection (1, 2, 3...)
-        match = re.search(r"\b([1-9])\b", t)
+        match = _DIGIT1_9_RE.search(t)
         if match:
             idx = int(match.group()) - 1
             if 0 <= idx < len(slots):
-                return slots[idx]["start_time"]
+                return slots[idx]
 
         return None
 
     def _valid_phone(self, phone: str) -> bool:
         """Validate phone number"""
-        digits = re.sub(r"\D", "", phone)
+        digits = _NON_DIGIT_RE.sub("", phone)
         return len(digits) >= 10
 
     def _valid_email(self, email: str) -> bool:
         """Validate email address"""
-        return bool(re.match(r"^[^@]+@[^@]+\.[^@]+$", email))
+        return bool(_EMAIL_RE.match(email))
 
     def _summary(self, mem: Dict) -> str:
         """Create booking summary"""
-        doctor = mem["doctor"]
+        doctor = self.availability.get_doctor_by_id(mem["doctor"]["doctor_id"]) or mem["doctor"]
         appt = self.APPOINTMENT_TYPES[mem["appointment_type"]]
 
         return (
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+SESSION_TTL = 1800  # seconds
+LOCAL_MAX_SESSIONS = 10_000
+JANITOR_INTERVAL = 60  # seconds
+LOCK_TIMEOUT = 120  # seconds; outlasts an LLM call with all its retries
+
+
+class SessionStore:
+    """
+    Conversation state keyed by session_id.
+
+    Uses Redis (msgpack-encoded, with TTL) when REDIS_URL is set so every
+    worker sees the same sessions; otherwise keeps them in-process in a
+    bounded TTL cache so abandoned sessions are eventually dropped.
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL):
+        self.ttl = ttl
+        self.redis = None
+        self._local: "TTLCache[str, Dict[str, Any]]" = TTLCache(maxsize=LOCAL_MAX_SESSIONS, ttl=ttl)
+        self._janitor_task: Optional[asyncio.Task] = None
+        # One lock per live session; entries disappear once no turn holds them
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        url = os.getenv("REDIS_URL")
+        if url:
+            import msgpack
+            import redis.asyncio
+
+            self._msgpack = msgpack
+            self.redis = redis.asyncio.from_url(url)
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"sess:{session_id}"
+
+    async def _janitor(self):
+        """Periodically purge expired local sessions (TTLCache only expires on access)."""
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL)
+            self._local.expire()
+
+    async def close(self):
+        """Stop the janitor task and close the Redis client; called on app shutdown."""
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+            try:
+                await self._janitor_task
+            except asyncio.CancelledError:
+                pass
+            self._janitor_task = None
+
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    async def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if self.redis is None:
+            # Started lazily — there is no running loop at construction time
+            if self._janitor_task is None:
+                self._janitor_task = asyncio.create_task(self._janitor())
+            return self._local.get(session_id)
+
+        raw = await self.redis.get(self._key(session_id))
+        return self._msgpack.unpackb(raw) if raw else None
+
+    async def save(self, session_id: str, memory: Dict[str, Any]):
+        if self.redis is None:
+            self._local[session_id] = memory
+            return
+
+        await self.redis.set(self._key(session_id), self._msgpack.packb(memory), ex=self.ttl)
+
+    def _lock(self, session_id: str):
+        """
+        Serialize turns of one session. Redis uses SET NX EX so the lock
+        holds across workers; otherwise an in-process asyncio.Lock.
+        """
+        if self.redis is not None:
+            return self.redis.lock(f"lock:{session_id}", timeout=LOCK_TIMEOUT)
+
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def session(self, session_id: str, factory: Callable[[], Dict[str, Any]]):
+        """Lock, load (or create) a session, hand it out, and write it back afterwards."""
+        async with self._lock(session_id):
+            memory = await self.load(session_id)
+            if memory is None:
+                memory = factory()
+            try:
+                yield memory
+            finally:
+                await self.save(session_id, memory)
@@ -1,17 +1,23 @@
 # backend/api/calendly_integration.py
 
+import logging
 from fastapi import APIRouter, HTTPException, Query
 from models.schemas import AppointmentRequest, AvailabilityResponse
 from tools.availability_tool import AvailabilityTool
 from tools.booking_tool import BookingTool
 from models.schemas import TimeSlot
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
+
+# Availability is computed in memory, so those handlers run on the event loop.
+# BookingTool pushes its disk I/O to worker threads itself.
 availability = AvailabilityTool()
 booking_tool = BookingTool()
 
 @router.get("/doctors")
-def get_doctors(
+async def get_doctors(
     date: str = Query(...),
     appointment_type: str = Query(...),
 ):
@@ -21,54 +27,39 @@ def get_doctors(
     - Work on that date
     """
     try:
-        # Will internally find relevant doctors
-        slots = availability.check(date, appointment_type)
-
-        # unique doctors
-        doctors = []
-        seen = set()
-
-        for slot in slots:
-            d_id = slot["doctor_id"]
-            if d_id not in seen:
-                doctors.append({
-                    "doctor_id": slot["doctor_id"],
-                    "name": slot["doctor_name"],
-                    "specialization": slot["specialization"],
-                    "rating": 4.7,  # static now
-                    "image": f"https://ui-avatars.com/api/?name={slot['doctor_name'].replace(' ', '+')}"
-                })
-                seen.add(d_id)
-
-        return {"doctors": doctors}
+        return {"doctors": availability.get_available_doctors(date, appointment_type)}
 
     except Exception as e:
+        logger.exception("Error listing doctors")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/availability", response_model=AvailabilityResponse)
-def get_availability(date: str, appointment_type: str):
+async def get_availability(date: str, appointment_type: str):
     try:
         slots_raw = availability.check(date, appointment_type)
 
-        slots = [TimeSlot(**slot) for slot in slots_raw]
+        slots = [TimeSlot(**slot._asdict()) for slot in slots_raw]
 
         return {"date": date, "available_slots": slots}
     except Exception as e:
+        logger.exception("Error checking availability")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/book")
-def book(payload: AppointmentRequest):
+async def book(payload: AppointmentRequest):
     try:
-        result = booking_tool.book(payload.dict())
+        result = await booking_tool.book(payload.dict())
         return result
     except Exception as e:
+        logger.exception("Error booking appointment")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.patch("/bookings/{booking_id}/cancel")
-def cancel_booking(booking_id: str):
+async def cancel_booking(booking_id: str):
     try:
-        result = booking_tool.cancel(booking_id)
+        result = await booking_tool.cancel(booking_id)
         return result
     except Exception as e:
+        logger.exception("Error cancelling booking %s", booking_id)
         raise HTTPException(status_code=500, detail=str(e))
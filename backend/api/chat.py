@@ -7,8 +7,8 @@ router = APIRouter()
 # Single shared agent (keeps session memory)
 agent = SchedulingAgent()
 
-@router.post("/")
-async def chat_endpoint(request: ChatRequest):
+@router.post("/", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest) -> ChatResponse:
     session_id = request.session_id or "default-session"
 
     response = await agent.handle_message(request.message, session_id)
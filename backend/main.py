@@ -1,9 +1,38 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.chat import router as chat_router
+from api.chat import agent as chat_agent, router as chat_router
 from api.calendly_integration import router as calendly_router
 
-app = FastAPI(title="Medical Appointment Scheduling Agent")
+# Log records are queued on the event loop and written by a background thread,
+# so a burst of errors never blocks request handling on stream I/O.
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+
+_root_logger = logging.getLogger()
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_root_logger.setLevel(logging.INFO)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shutdown: close the shared agent's HTTP pool, session store and its janitor
+    await chat_agent.llm.client.aclose()
+    await chat_agent.sessions.close()
+
+
+app = FastAPI(title="Medical Appointment Scheduling Agent", lifespan=lifespan)
 
 # 🔥 Allow frontend to call backend
 origins = [
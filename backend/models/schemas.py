@@ -1,6 +1,27 @@
-from pydantic import BaseModel, EmailStr
+import os
+import re
+from functools import lru_cache
+from pydantic import BaseModel, field_validator
 from typing import Optional, List
 
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Full RFC validation (what EmailStr does via email-validator) only on request
+STRICT_EMAIL_VALIDATION = os.getenv("STRICT_EMAIL_VALIDATION", "0") == "1"
+
+
+@lru_cache(maxsize=1024)
+def _check_email(value: str) -> str:
+    """Validate (and with strict mode, normalize) an email; results are memoized."""
+    if STRICT_EMAIL_VALIDATION:
+        from email_validator import validate_email
+        return validate_email(value, check_deliverability=False).normalized
+
+    if not _EMAIL_RE.match(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
+
 class AppointmentRequest(BaseModel):
     appointment_type: str
     date: str
@@ -8,9 +29,14 @@ class AppointmentRequest(BaseModel):
     doctor_id: int
     reason: str
     patient_name: str
-    patient_email: EmailStr
+    patient_email: str
     patient_phone: str
 
+    @field_validator("patient_email")
+    @classmethod
+    def _valid_email(cls, value: str) -> str:
+        return _check_email(value)
+
 class TimeSlot(BaseModel):
     start_time: str
     end_time: str
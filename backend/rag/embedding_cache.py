@@ -0,0 +1,90 @@
+"""
+On-disk cache of embeddings, keyed by hash(model + text).
+
+One .npz file per model under data/.embed_cache/ holds the keys and a
+float32 matrix of vectors, so a restart loads every FAQ embedding with a
+single read instead of re-embedding the corpus.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+try:
+    from blake3 import blake3 as _hasher
+except ImportError:  # stdlib fallback
+    _hasher = hashlib.sha256
+
+CACHE_DIR = Path(__file__).resolve().parents[2] / "data" / ".embed_cache"
+
+
+def _key(model: str, text: str) -> str:
+    return _hasher(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _path(model: str) -> Path:
+    return CACHE_DIR / (re.sub(r"[^\w.-]", "_", model) + ".npz")
+
+
+def _load(model: str, dim: int) -> dict:
+    """Cached vectors for this model; empty if missing, unreadable or a different dimension."""
+    path = _path(model)
+    if not path.exists():
+        return {}
+    try:
+        with np.load(path) as data:
+            keys, vectors = data["keys"], data["vectors"]
+    except (OSError, KeyError, ValueError):
+        return {}
+    if vectors.ndim != 2 or vectors.shape[1] != dim:
+        return {}
+    return dict(zip(keys.tolist(), vectors))
+
+
+def _save(model: str, entries: dict):
+    """Write atomically so a crash never leaves a truncated cache behind."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    keys = np.array(list(entries.keys()))
+    vectors = np.stack(list(entries.values())).astype(np.float32, copy=False)
+
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, keys=keys, vectors=vectors)
+        os.replace(tmp, _path(model))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def get_or_compute_many(
+    texts: Sequence[str],
+    model: str,
+    compute_batch: Callable[[List[str]], List[List[float]]],
+    dim: int,
+) -> List[np.ndarray]:
+    """
+    Embeddings for texts, computing only the ones not cached yet.
+
+    Vectors whose length differs from dim (e.g. a local fallback used when
+    the remote call failed) are returned but never written to the cache.
+    """
+    keys = [_key(model, t) for t in texts]
+    cached = _load(model, dim)
+
+    missing = [i for i, k in enumerate(keys) if k not in cached]
+    computed = {}
+    if missing:
+        vectors = compute_batch([texts[i] for i in missing])
+        for i, vec in zip(missing, vectors):
+            computed[keys[i]] = np.asarray(vec, dtype=np.float32)
+
+        fresh = {k: v for k, v in computed.items() if v.shape == (dim,)}
+        if fresh:
+            _save(model, {**cached, **fresh})
+
+    return [cached[k] if k in cached else computed[k] for k in keys]
@@ -2,60 +2,118 @@
 Lightweight embedding alternative without PyTorch dependency.
 Uses OpenAI API or a simple TF-IDF approach.
 """
+import hashlib
+import logging
 import os
 from typing import List
 
+from .embedding_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_EMBED_MODEL = "text-embedding-3-small"
+OPENROUTER_EMBED_DIM = 1536
+
+_CLIENT = None
+
+
+def _client():
+    """
+    Shared OpenAI client for OpenRouter, created on first use so its
+    connection pool is reused across embedding calls.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        from openai import OpenAI
+        _CLIENT = OpenAI(
+            base_url="https://openrouter.ai/api/v1",
+            api_key=os.getenv("OPENROUTER_API_KEY")
+        )
+    return _CLIENT
+
 # Option 1: Using OpenRouter API (requires OPENROUTER_API_KEY environment variable)
 def embed_text_openai(text: str) -> List[float]:
     """
     Generate embeddings using OpenRouter's API.
     Requires: pip install openai
     """
+    return embed_texts_openai([text])[0]
+
+
+def embed_texts_openai(texts: List[str]) -> List[List[float]]:
+    """
+    Embed many texts with one OpenRouter request (the endpoint accepts
+    up to 2048 inputs), instead of one round-trip per text.
+    """
     try:
-        from openai import OpenAI
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.getenv("OPENROUTER_API_KEY")
+        response = _client().embeddings.create(
+            model=OPENROUTER_EMBED_MODEL,  # OpenAI model via OpenRouter
+            input=texts
         )
-        
-        response = client.embeddings.create(
-            model="text-embedding-3-small",  # OpenAI model via OpenRouter
-            input=text
-        )
-        return response.data[0].embedding
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
     except Exception as e:
-        print(f"OpenRouter embedding error: {e}")
-        return embed_text_fallback(text)
+        logger.warning("OpenRouter embedding error, using hash fallback: %s", e)
+        return [embed_text_fallback(t) for t in texts]
 
 
-# Option 2: Simple TF-IDF based approach (no external API needed)
-def embed_text_tfidf(text: str, dimension: int = 384) -> List[float]:
+# Option 2: TF-IDF + SVD fitted once on the FAQ corpus (no external API needed)
+_VECTORIZER = None
+_SVD = None
+TFIDF_CACHE = CACHE_DIR / "tfidf.joblib"
+
+
+def fit_tfidf(corpus: List[str], dimension: int = 384):
     """
-    Simple hash-based embedding for development/testing.
-    Not as accurate as transformer models but works without dependencies.
+    Fit the TF-IDF vocabulary and SVD projection once on the corpus, so
+    embed_text_tfidf() only has to transform. The fitted pair is saved with
+    joblib and reused on restart while the corpus is unchanged.
     Requires: pip install scikit-learn
     """
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.decomposition import TruncatedSVD
-    import numpy as np
-    
-    # Create a simple vectorizer
+    global _VECTORIZER, _SVD
+    try:
+        import joblib
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.decomposition import TruncatedSVD
+    except ImportError:
+        return  # embed_text_tfidf() falls back to hashing
+
+    corpus_key = hashlib.sha256("\0".join(corpus).encode("utf-8")).hexdigest()
+    try:
+        saved_key, vectorizer, svd = joblib.load(TFIDF_CACHE)
+        if saved_key == corpus_key:
+            _VECTORIZER, _SVD = vectorizer, svd
+            return
+    except Exception:
+        pass  # missing or stale cache — refit
+
     vectorizer = TfidfVectorizer(max_features=1000)
-    
-    # Fit and transform (in production, you'd fit once on your corpus)
+    matrix = vectorizer.fit_transform(corpus)
+
+    # SVD can't produce more components than the corpus has documents/terms
+    n_components = max(1, min(dimension, matrix.shape[0] - 1, matrix.shape[1] - 1))
+    svd = TruncatedSVD(n_components=n_components, random_state=0).fit(matrix)
+
+    _VECTORIZER, _SVD = vectorizer, svd
     try:
-        vector = vectorizer.fit_transform([text]).toarray()[0]
-        
-        # Pad or truncate to desired dimension
-        if len(vector) < dimension:
-            vector = np.pad(vector, (0, dimension - len(vector)))
-        else:
-            vector = vector[:dimension]
-            
-        return vector.tolist()
-    except:
+        TFIDF_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump((corpus_key, vectorizer, svd), TFIDF_CACHE)
+    except OSError as e:
+        logger.warning("TF-IDF cache write error: %s", e)
+
+
+def embed_text_tfidf(text: str) -> List[float]:
+    """
+    Project text into the space fitted by fit_tfidf().
+    Falls back to hashing until a corpus has been fitted.
+    """
+    if _VECTORIZER is None:
         return embed_text_fallback(text)
 
+    import numpy as np
+
+    vector = _SVD.transform(_VECTORIZER.transform([text]))
+    return vector.astype(np.float32).ravel().tolist()
+
 
 # Option 3: Ultra-simple fallback (deterministic hash-based)
 def embed_text_fallback(text: str, dimension: int = 384) -> List[float]:
@@ -63,24 +121,20 @@ def embed_text_fallback(text: str, dimension: int = 384) -> List[float]:
     Fallback embedding using simple hashing.
     Good enough for development but not recommended for production.
     """
-    import hashlib
-    import struct
-    
-    # Create deterministic embedding from text hash
-    hash_obj = hashlib.sha256(text.encode())
-    hash_bytes = hash_obj.digest()
-    
-    # Convert to floats
-    embedding = []
-    for i in range(0, len(hash_bytes) - 3, 4):
-        val = struct.unpack('f', hash_bytes[i:i+4])[0]
-        embedding.append(val)
-    
-    # Pad or truncate to dimension
-    while len(embedding) < dimension:
-        embedding.extend(embedding[:min(len(embedding), dimension - len(embedding))])
-    
-    return embedding[:dimension]
+    import numpy as np
+
+    # One extendable-output hash call yields all dimension*4 bytes at once
+    data = text.encode("utf-8")
+    try:
+        from blake3 import blake3
+        raw = blake3(data).digest(length=dimension * 4)
+    except ImportError:
+        raw = hashlib.shake_256(data).digest(dimension * 4)
+
+    # Map uint32 words onto [-1, 1) — unlike raw float bits, never NaN/inf
+    vec = np.frombuffer(raw, dtype=np.uint32) / 2.0**31 - 1.0
+    vec /= np.linalg.norm(vec) + 1e-12
+    return vec.astype(np.float32).tolist()
 
 
 # Main function - choose your preferred method
@@ -100,6 +154,16 @@ def embed_text(text: str) -> List[float]:
         return embed_text_fallback(text)
 
 
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Batch version of embed_text() — one API call for the whole list.
+    """
+    if os.getenv("OPENROUTER_API_KEY"):
+        return embed_texts_openai(texts)
+
+    return [embed_text(t) for t in texts]
+
+
 # If you still want to use sentence-transformers but avoid the DLL issue,
 # you can try using ONNX runtime instead:
 def embed_text_onnx(text: str) -> List[float]:
@@ -123,5 +187,5 @@ def embed_text_onnx(text: str) -> List[float]:
         embeddings = outputs.last_hidden_state.mean(dim=1)
         return embeddings[0].detach().numpy().tolist()
     except Exception as e:
-        print(f"ONNX embedding error: {e}")
+        logger.warning("ONNX embedding error, using hash fallback: %s", e)
         return embed_text_fallback(text)
\ No newline at end of file
@@ -1,20 +1,108 @@
 from .vector_store import VectorStore
-from .embeddings import embed_text
-import json
+from .embeddings import embed_text, embed_texts, fit_tfidf, OPENROUTER_EMBED_DIM, OPENROUTER_EMBED_MODEL
+from .embedding_cache import get_or_compute_many
+from .semantic_cache import SemanticCache
+import logging
+import os
 from pathlib import Path
+from typing import Optional
+
+import orjson
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Reply when nothing can be retrieved (e.g. the query embedding has another size)
+NO_ANSWER = "Sorry, I don't have information about that. Please contact the clinic directly."
 
 class FAQ_RAG:
     def __init__(self):
         self.store = VectorStore()
+        self.cache = SemanticCache()
+        # LLM answers keyed by (normalized question, retrieved FAQ ids)
+        self._answers = LRUCache(maxsize=512)
         data_path = Path(__file__).resolve().parents[2] / "data" / "clinic_info.json"
         self.load_data(data_path)
 
     def load_data(self, path):
-        with open(path, "r") as f:
-            data = json.load(f)
-        for item in data:
-            self.store.add(item["question"] + " " + item["answer"], embed_text(item["question"]))
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
+
+        questions = [item["question"] for item in data]
+        if os.getenv("OPENROUTER_API_KEY"):
+            # Remote embeddings dominate startup — reuse them across restarts
+            embeddings = get_or_compute_many(
+                questions,
+                OPENROUTER_EMBED_MODEL,
+                embed_texts,
+                dim=OPENROUTER_EMBED_DIM,
+            )
+        else:
+            fit_tfidf(questions)
+            embeddings = embed_texts(questions)
+
+        for item, embedding in zip(data, embeddings):
+            self.store.add(item["question"] + " " + item["answer"], embedding)
 
     def query(self, question: str):
-        result = self.store.search(embed_text(question))
-        return result[0]["text"]
+        # Exact repeat: no embedding call at all
+        answer = self.cache.get_exact(question)
+        if answer is not None:
+            return answer
+
+        # Near-duplicate of an earlier question: skip the search
+        embedding = embed_text(question)
+        answer = self.cache.get_similar(embedding)
+        if answer is None:
+            results = self.store.search(embedding)
+            if not results:
+                return NO_ANSWER  # not cached, so a later query can still succeed
+            answer = results[0]["text"]
+
+        self.cache.put(question, embedding, answer)
+        return answer
+
+    async def query_with_llm(self, question: str, llm, system_prompt: str) -> str:
+        """
+        Answer phrased by the LLM from the top retrieved FAQs. The answer is
+        written for this question, so it is cached per normalized question
+        (and the FAQs it was grounded on), not per embedding neighbourhood.
+        """
+        embedding = embed_text(question)
+        results = self.store.search(embedding)
+        if not results:
+            return NO_ANSWER
+
+        key = (" ".join(question.lower().split()), tuple(sorted(r["id"] for r in results)))
+        answer = self._answers.get(key)
+        if answer is not None:
+            return answer
+
+        context = "\n".join(f"- {r['text']}" for r in results)
+        try:
+            answer = await llm.respond(
+                system_prompt,
+                f"Clinic information:\n{context}\n\nQuestion: {question}",
+                response_format=None,
+                max_tokens=200,
+            )
+        except Exception:
+            logger.exception("FAQ answer generation failed")
+            return results[0]["text"]
+
+        answer = answer.strip()
+        if not answer:
+            return results[0]["text"]
+        self._answers[key] = answer
+        return answer
+
+
+_INSTANCE: Optional[FAQ_RAG] = None
+
+
+def get_faq_rag() -> FAQ_RAG:
+    """Process-wide FAQ_RAG, built on first use."""
+    global _INSTANCE
+    if _INSTANCE is None:
+        _INSTANCE = FAQ_RAG()
+    return _INSTANCE
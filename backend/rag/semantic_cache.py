@@ -0,0 +1,87 @@
+"""
+Semantic answer cache for FAQ queries.
+
+Exact repeats are found by normalized text, before any embedding work.
+Near-duplicates ("what are your hours?" / "what are your hours") are found
+by random-projection LSH: the query embedding is hashed to a K-bit bucket,
+and the bucket's entry is reused if its cosine similarity clears a
+threshold, skipping the vector search.
+"""
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        n_planes: int = 8,
+        threshold: float = 0.95,
+        maxsize: int = 1024,
+        seed: int = 0,
+    ):
+        self.n_planes = n_planes
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.seed = seed
+
+        self._planes: Optional[np.ndarray] = None  # (K, D), sampled once D is known
+        self._exact: "OrderedDict[str, str]" = OrderedDict()
+        self._buckets: "OrderedDict[int, tuple[np.ndarray, str]]" = OrderedDict()
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def _unit(self, embedding: Sequence[float]) -> Optional[np.ndarray]:
+        """Unit-length float32 vector, or None if it doesn't fit the hyperplanes."""
+        v = np.asarray(embedding, dtype=np.float64)
+        if self._planes is None:
+            rng = np.random.default_rng(self.seed)
+            self._planes = rng.standard_normal((self.n_planes, v.shape[0]))
+        elif v.shape[0] != self._planes.shape[1]:
+            return None  # e.g. a fallback embedding of a different size
+        return (v / (np.linalg.norm(v) + 1e-12)).astype(np.float32)
+
+    def _bucket(self, v: np.ndarray) -> int:
+        bits = np.packbits(self._planes @ v > 0)
+        return int.from_bytes(bits.tobytes(), "big")
+
+    @staticmethod
+    def _touch(lru: OrderedDict, key, maxsize: int, value=None):
+        if value is not None:
+            lru[key] = value
+        lru.move_to_end(key)
+        while len(lru) > maxsize:
+            lru.popitem(last=False)
+
+    def get_exact(self, text: str) -> Optional[str]:
+        key = self._normalize_text(text)
+        answer = self._exact.get(key)
+        if answer is not None:
+            self._touch(self._exact, key, self.maxsize)
+        return answer
+
+    def get_similar(self, embedding: Sequence[float]) -> Optional[str]:
+        v = self._unit(embedding)
+        if v is None:
+            return None
+
+        bucket = self._bucket(v)
+        entry = self._buckets.get(bucket)
+        if entry is None:
+            return None
+
+        cached_v, answer = entry
+        if not float(cached_v @ v) >= self.threshold:  # also rejects NaN
+            return None
+        self._touch(self._buckets, bucket, self.maxsize)
+        return answer
+
+    def put(self, text: str, embedding: Sequence[float], answer: str):
+        self._touch(self._exact, self._normalize_text(text), self.maxsize, answer)
+
+        v = self._unit(embedding)
+        if v is not None:
+            self._touch(self._buckets, self._bucket(v), self.maxsize, (v, answer))
@@ -1,39 +1,75 @@
-import math
+import numpy as np
+
+CACHE_LINE = 64  # bytes
+INITIAL_CAPACITY = 16  # rows
+
+
+def _aligned_empty(shape) -> np.ndarray:
+    """Uninitialized C-contiguous float32 array whose data starts on a cache line."""
+    n = int(np.prod(shape))
+    pad = CACHE_LINE // 4
+    buf = np.empty(n + pad, dtype=np.float32)
+    offset = (-buf.ctypes.data % CACHE_LINE) // 4
+    return buf[offset:offset + n].reshape(shape)
+
 
 class VectorStore:
+    """
+    In-memory vector index. Embeddings are L2-normalized on insert and kept
+    as rows of one float32 matrix, so a search is a single matrix-vector
+    product instead of a Python loop per item.
+
+    Invariant: the matrix is C-contiguous float32 starting on a 64-byte
+    boundary, which keeps the BLAS kernel on its aligned SIMD path.
+    """
+
     def __init__(self):
-        self.store = []
+        self._texts = []
+        self._buf = None     # shape (capacity, D), doubled when full
+        self._matrix = None  # view of the first N rows, unit length
 
-    def add(self, text, embedding):
-        self.store.append({
-            "text": text,
-            "embedding": embedding
-        })
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """Unit-length float32 copy; normalized in float64 so large values don't overflow."""
+        v = np.asarray(embedding, dtype=np.float64)
+        return (v / (np.linalg.norm(v) + 1e-12)).astype(np.float32)
 
-    def _cosine_similarity(self, a, b):
-        """Compute cosine similarity between two vectors."""
-        dot = sum(x * y for x, y in zip(a, b))
-        norm_a = math.sqrt(sum(x * x for x in a))
-        norm_b = math.sqrt(sum(y * y for y in b))
+    def add(self, text, embedding):
+        row = self._normalize(embedding)
+        n = len(self._texts)
 
-        if norm_a == 0 or norm_b == 0:
-            return 0.0  # avoid division by zero
+        # Amortized O(1) append: grow the backing buffer by doubling
+        if self._buf is None:
+            self._buf = _aligned_empty((INITIAL_CAPACITY, row.shape[0]))
+        elif n == self._buf.shape[0]:
+            grown = _aligned_empty((n * 2, self._buf.shape[1]))
+            grown[:n] = self._buf
+            self._buf = grown
 
-        return dot / (norm_a * norm_b)
+        self._buf[n] = row
+        self._matrix = self._buf[:n + 1]
+        self._texts.append(text)
 
     def search(self, query_embedding):
-        """Return top 3 most similar items."""
-        results = []
+        """Return top 3 most similar items; id is the item's insertion index."""
+        if self._matrix is None:
+            return []
+        assert self._matrix.flags["C_CONTIGUOUS"]
 
-        for item in self.store:
-            score = self._cosine_similarity(query_embedding, item["embedding"])
-            results.append({
-                "text": item["text"],
-                "score": score
-            })
+        q = self._normalize(query_embedding)
+        if q.shape != (self._matrix.shape[1],):
+            return []  # e.g. a fallback embedding of a different size
 
-        # Sort by similarity (highest first)
-        results.sort(key=lambda x: x["score"], reverse=True)
+        # Rows and query are unit length, so the dot product is the cosine
+        scores = self._matrix @ q
 
-        # Return top 3 results
-        return results[:3]
+        # Partial selection of the top k (O(N)), then order just those
+        k = min(3, scores.size)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"id": int(i), "text": self._texts[i], "score": float(scores[i])}
+            for i in top
+        ]
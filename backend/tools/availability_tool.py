@@ -1,7 +1,78 @@
-import json
+import re
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from datetime import date as date_cls, datetime, timedelta
+from typing import List, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from tools.booking_tool import BookingTool
+
+_DAYS_OF_WEEK = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
+    "friday": 4, "saturday": 5, "sunday": 6
+}
+_NL_DATE_RE = re.compile(r"\b(today|tomorrow|" + "|".join(_DAYS_OF_WEEK) + r")\b")
+
+# Most frequent first — the chat agent always sends ISO dates
+_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d-%m-%Y", "%B %d", "%b %d")
+
+# "HH:MM" for every minute of the day, indexed by minute
+MIN_TO_HHMM = [f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)]
+
+
+class Slot(NamedTuple):
+    """One bookable slot; ._asdict() gives the JSON shape the API returns."""
+    start_time: str
+    end_time: str
+    available: bool
+    duration: int
+    doctor_id: int
+    doctor_name: str
+    specialization: str
+
+
+def _to_minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+@lru_cache(maxsize=256)
+def _parse_date_cached(date_lower: str, today_ordinal: int) -> Optional[datetime]:
+    """
+    Resolve a stripped, lowercased date string relative to the given day.
+    Keyed on the day too, so "tomorrow" never outlives midnight.
+    """
+    today = date_cls.fromordinal(today_ordinal)
+
+    # Handle today / tomorrow / "next Monday", "this Friday", etc.
+    match = _NL_DATE_RE.search(date_lower)
+    if match:
+        word = match.group(1)
+        if word == "today":
+            target_date = today
+        elif word == "tomorrow":
+            target_date = today + timedelta(days=1)
+        else:
+            # Find next occurrence of this day (never today)
+            days_ahead = (_DAYS_OF_WEEK[word] - today.weekday()) % 7 or 7
+            target_date = today + timedelta(days=days_ahead)
+        return datetime.combine(target_date, datetime.min.time())
+
+    # Try standard date formats
+    for fmt in _DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(date_lower, fmt)
+        except ValueError:
+            continue
+        # If year not provided, assume current year
+        if parsed.year == 1900:
+            parsed = parsed.replace(year=today.year)
+        return parsed
+
+    return None
 
 
 class AvailabilityTool:
@@ -13,16 +84,11 @@ class AvailabilityTool:
     def __init__(self):
         # Load doctor profiles
         data_path = Path(__file__).resolve().parents[2] / "data" / "doctors.json"
-        with open(data_path, "r") as f:
-            self.doctors = json.load(f)
+        with open(data_path, "rb") as f:
+            self.doctors = orjson.loads(f.read())
         
-        # Load existing bookings (if file exists)
-        bookings_path = Path(__file__).resolve().parents[2] / "data" / "bookings.json"
-        try:
-            with open(bookings_path, "r") as f:
-                self.bookings = json.load(f)
-        except FileNotFoundError:
-            self.bookings = []  # No bookings yet
+        # Shared singleton — its booked-slot index is current for every instance
+        self.booking_tool = BookingTool()
 
         # Map appointment types to specializations
         self.appointment_to_specialization = {
@@ -42,7 +108,25 @@ class AvailabilityTool:
             "specialist": None
         }
 
-    def check(self, date: str, appointment_type: str, doctor_id: Optional[int] = None) -> List[Dict]:
+        # Working hours never change, so each doctor's slot start minutes are
+        # computed once; check() only has to merge them and mark bookings.
+        self._slot_starts: Dict[int, np.ndarray] = {
+            d["doctor_id"]: self._slot_start_minutes(d) for d in self.doctors
+        }
+        self._working_days: Dict[int, frozenset] = {
+            d["doctor_id"]: frozenset(d["working_days"]) for d in self.doctors
+        }
+
+        # Lookup indexes; the None specialization ("specialist") means any doctor
+        self._by_id: Dict[int, Dict] = {d["doctor_id"]: d for d in self.doctors}
+        self._by_spec_day: Dict[Tuple[Optional[str], str], List[Dict]] = defaultdict(list)
+        for d in self.doctors:
+            for day in d["working_days"]:
+                self._by_spec_day[(d["specialization"], day)].append(d)
+                self._by_spec_day[(None, day)].append(d)
+        self._all_specializations = frozenset(d["specialization"] for d in self.doctors)
+
+    def check(self, date: str, appointment_type: str, doctor_id: Optional[int] = None) -> List[Slot]:
         """
         Generate available time slots for a given date and appointment type.
         
@@ -68,60 +152,62 @@ class AvailabilityTool:
         if not relevant_doctors:
             return []
         
-        # Generate slots for each doctor
+        # Every relevant doctor's slot grid as flat parallel arrays
+        grids = [self._slot_starts[d["doctor_id"]] for d in relevant_doctors]
+        starts = np.concatenate(grids)
+        owners = np.repeat(np.arange(len(relevant_doctors)), [g.size for g in grids])
+
+        # Sort by time (stable, so doctor order breaks ties)
+        order = np.argsort(starts, kind="stable")
+
+        booked = self.booking_tool.booked_slots(date_str)
         all_slots = []
-        for doctor in relevant_doctors:
-            slots = self._generate_slots_for_doctor(doctor, date_str, day_of_week, appointment_type)
-            all_slots.extend(slots)
-        
-        # Sort by time
-        all_slots.sort(key=lambda x: x["start_time"])
-        
+        for start, owner in zip(starts[order].tolist(), owners[order].tolist()):
+            doctor = relevant_doctors[owner]
+            duration = doctor["appointment_duration_minutes"]
+            start_time = MIN_TO_HHMM[start]
+            all_slots.append(Slot(
+                start_time,
+                MIN_TO_HHMM[start + duration],
+                (doctor["doctor_id"], start_time) not in booked,
+                duration,
+                doctor["doctor_id"],
+                doctor["name"],
+                doctor["specialization"],
+            ))
+
         return all_slots
 
+    def slots_at(self, date: str, doctor_id: int, start_times: List[str]) -> List[Slot]:
+        """
+        Slots for one doctor at the given start times (e.g. ones kept in session
+        memory), with availability checked against the current bookings.
+        """
+        parsed_date = self._parse_date(date)
+        doctor = self._by_id.get(doctor_id)
+        if not parsed_date or not doctor:
+            return []
+
+        booked = self.booking_tool.booked_slots(parsed_date.strftime("%Y-%m-%d"))
+        duration = doctor["appointment_duration_minutes"]
+        return [
+            Slot(
+                start_time,
+                MIN_TO_HHMM[_to_minutes(start_time) + duration],
+                (doctor_id, start_time) not in booked,
+                duration,
+                doctor_id,
+                doctor["name"],
+                doctor["specialization"],
+            )
+            for start_time in start_times
+        ]
+
     def _parse_date(self, date: str) -> Optional[datetime]:
         """
         Parse various date formats including natural language.
         """
-        date_lower = date.lower().strip()
-        today = datetime.now().date()
-        
-        # Handle natural language dates
-        if date_lower in ["today"]:
-            return datetime.combine(today, datetime.min.time())
-        
-        if date_lower in ["tomorrow"]:
-            return datetime.combine(today + timedelta(days=1), datetime.min.time())
-        
-        # Handle "next Monday", "this Friday", etc.
-        days_of_week = {
-            "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
-            "friday": 4, "saturday": 5, "sunday": 6
-        }
-        
-        for day_name, day_num in days_of_week.items():
-            if day_name in date_lower:
-                # Find next occurrence of this day
-                days_ahead = day_num - today.weekday()
-                if days_ahead <= 0:  # Target day already happened this week
-                    days_ahead += 7
-                target_date = today + timedelta(days=days_ahead)
-                return datetime.combine(target_date, datetime.min.time())
-        
-        # Try standard date formats
-        formats = ["%Y-%m-%d", "%m/%d/%Y", "%d-%m-%Y", "%B %d", "%b %d"]
-        
-        for fmt in formats:
-            try:
-                parsed = datetime.strptime(date, fmt)
-                # If year not provided, assume current year
-                if parsed.year == 1900:
-                    parsed = parsed.replace(year=today.year)
-                return parsed
-            except ValueError:
-                continue
-        
-        return None
+        return _parse_date_cached(date.strip().lower(), datetime.now().date().toordinal())
 
     def _get_relevant_doctors(self, appointment_type: str, doctor_id: Optional[int], day_of_week: str) -> List[Dict]:
         """
@@ -129,82 +215,55 @@ class AvailabilityTool:
         """
         if doctor_id:
             # Specific doctor requested
-            doctor = next((d for d in self.doctors if d["doctor_id"] == doctor_id), None)
-            if doctor and day_of_week in doctor["working_days"]:
+            doctor = self._by_id.get(doctor_id)
+            if doctor and day_of_week in self._working_days[doctor_id]:
                 return [doctor]
             return []
         
         # Find doctors by specialization
         specialization = self.appointment_to_specialization.get(appointment_type, "General Physician")
-        
-        relevant = []
-        for doctor in self.doctors:
-            # Check if doctor works on this day
-            if day_of_week not in doctor["working_days"]:
-                continue
-            
-            # Check specialization match
-            if specialization and doctor["specialization"] != specialization:
-                continue
-            
-            relevant.append(doctor)
-        
-        return relevant
+        return self._by_spec_day.get((specialization, day_of_week), [])
 
-    def _generate_slots_for_doctor(self, doctor: Dict, date_str: str, day_of_week: str, appointment_type: str) -> List[Dict]:
+    @staticmethod
+    def _slot_start_minutes(doctor: Dict) -> np.ndarray:
         """
-        Generate time slots for a specific doctor on a specific date.
+        Start minute of every slot that fits in a doctor's working day.
         """
-        slots = []
-        
-        # Get doctor's working hours
-        start_time_str = doctor["working_hours"]["start"]
-        end_time_str = doctor["working_hours"]["end"]
-        slot_duration = doctor["appointment_duration_minutes"]
-        
-        # Parse times
-        start_time = datetime.strptime(start_time_str, "%H:%M").time()
-        end_time = datetime.strptime(end_time_str, "%H:%M").time()
-        
-        # Generate slots
-        current_time = datetime.combine(datetime.today(), start_time)
-        end_datetime = datetime.combine(datetime.today(), end_time)
-        
-        while current_time + timedelta(minutes=slot_duration) <= end_datetime:
-            slot_start = current_time.strftime("%H:%M")
-            slot_end = (current_time + timedelta(minutes=slot_duration)).strftime("%H:%M")
-            
-            # Check if slot is booked
-            is_available = self._is_slot_available(doctor["doctor_id"], date_str, slot_start)
-            
-            slots.append({
-                "start_time": slot_start,
-                "end_time": slot_end,
-                "available": is_available,
-                "duration": slot_duration,
-                "doctor_id": doctor["doctor_id"],
-                "doctor_name": doctor["name"],
-                "specialization": doctor["specialization"]
-            })
-            
-            current_time += timedelta(minutes=slot_duration)
-        
-        return slots
+        start = _to_minutes(doctor["working_hours"]["start"])
+        end = _to_minutes(doctor["working_hours"]["end"])
+        duration = doctor["appointment_duration_minutes"]
+        return np.arange(start, end - duration + 1, duration)
 
-    def _is_slot_available(self, doctor_id: int, date: str, start_time: str) -> bool:
+    def get_available_doctors(self, date: str, appointment_type: str) -> List[Dict]:
         """
-        Check if a specific slot is available (not booked).
+        Doctors who match the appointment type and work on that date,
+        in order of their earliest slot.
         """
-        for booking in self.bookings:
-            if (booking.get("doctor_id") == doctor_id and 
-                booking.get("date") == date and 
-                booking.get("start_time") == start_time):
-                return False
-        return True
+        return self.doctors_from_slots(self.check(date, appointment_type))
+
+    @staticmethod
+    def doctors_from_slots(slots: List[Slot]) -> List[Dict]:
+        """Unique doctors (display shape) from a list of slots, in slot order."""
+        doctors = []
+        seen = set()
+
+        for slot in slots:
+            d_id = slot.doctor_id
+            if d_id not in seen:
+                doctors.append({
+                    "doctor_id": slot.doctor_id,
+                    "name": slot.doctor_name,
+                    "specialization": slot.specialization,
+                    "rating": 4.7,  # static now
+                    "image": f"https://ui-avatars.com/api/?name={slot.doctor_name.replace(' ', '+')}"
+                })
+                seen.add(d_id)
+
+        return doctors
 
     def get_doctor_by_id(self, doctor_id: int) -> Optional[Dict]:
         """Get doctor information by ID."""
-        return next((d for d in self.doctors if d["doctor_id"] == doctor_id), None)
+        return self._by_id.get(doctor_id)
 
     def get_doctors_by_specialization(self, specialization: str) -> List[Dict]:
         """Get all doctors of a specific specialization."""
@@ -212,4 +271,4 @@ class AvailabilityTool:
 
     def get_all_specializations(self) -> List[str]:
         """Get list of all available specializations."""
-        return list(set(d["specialization"] for d in self.doctors))
\ No newline at end of file
+        return list(self._all_specializations)
\ No newline at end of file
@@ -1,75 +1,175 @@
-import json
+import asyncio
+from collections import Counter, defaultdict
+import logging
+import os
 from pathlib import Path
+import threading
 import time
 import uuid
 
+import orjson
+
+logger = logging.getLogger(__name__)
+
 class BookingTool:
-    DATA_PATH = Path(__file__).resolve().parents[2] / "data" / "booking.json"
+    """
+    Bookings live in memory and every change is appended to a JSONL log:
+    a booking record per line, plus {"op": "cancel", "booking_id": ...}
+    lines for cancellations. The log is replayed once at startup.
+    Shared singleton, so every BookingTool() sees the same bookings.
+    """
+    DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+    LOG_PATH = DATA_DIR / "bookings.jsonl"
+    LEGACY_PATH = DATA_DIR / "booking.json"  # seeds the log on first run
 
-    def _load_bookings(self):
-        if not self.DATA_PATH.exists():
-            return []
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        # Appends run in worker threads
+        self._lock = threading.Lock()
+        self.bookings = []
+        self._by_id = {}
+        self._by_conf = {}
+        # date -> Counter of (doctor_id, start_time) over active bookings, for availability
+        self._booked = defaultdict(Counter)
+
+        if self.LOG_PATH.exists():
+            self._replay()
+        else:
+            for b in self._load_legacy():
+                self._add(b)
+            self._append(*self.bookings)
+
+    # ---- storage ----
+    def _replay(self):
+        with open(self.LOG_PATH, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # torn last line after a crash
+
+                if record.get("op") == "cancel":
+                    booking = self._by_id.get(record["booking_id"])
+                    if booking:
+                        self._mark_cancelled(booking)
+                else:
+                    self._add(record)
+
+    def _load_legacy(self):
         try:
-            with open(self.DATA_PATH, "r") as f:
+            with open(self.LEGACY_PATH, "rb") as f:
                 data = f.read().strip()
-                return json.loads(data) if data else []
-        except:
+                return orjson.loads(data) if data else []
+        except (OSError, orjson.JSONDecodeError):
             return []
 
-    def _save_bookings(self, bookings):
-        with open(self.DATA_PATH, "w") as f:
-            json.dump(bookings, f, indent=2)
+    def _append(self, *records):
+        with open(self.LOG_PATH, "ab") as f:
+            for record in records:
+                f.write(orjson.dumps(record) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
 
-    def book(self, payload):
-        bookings = self._load_bookings()
+    def _add(self, booking):
+        self.bookings.append(booking)
+        # Older logs may repeat an id; keep the first so lookups stay stable
+        if self._by_id.setdefault(booking["booking_id"], booking) is not booking:
+            logger.warning("Duplicate booking id %s in log", booking["booking_id"])
+        if self._by_conf.setdefault(booking["confirmation_code"], booking) is not booking:
+            logger.warning("Duplicate confirmation code %s in log", booking["confirmation_code"])
+        if booking.get("status") != "cancelled":
+            self._booked[booking.get("date")][self._slot_key(booking)] += 1
 
-        booking_id = f"APPT-{int(time.time())}"
-        confirmation_code = uuid.uuid4().hex[:6].upper()
+    def _mark_cancelled(self, booking):
+        if booking.get("status") == "cancelled":
+            return  # replayed twice; the slot was already released
+        booking["status"] = "cancelled"
+        booked = self._booked[booking.get("date")]
+        key = self._slot_key(booking)
+        booked[key] -= 1
+        if booked[key] <= 0:
+            del booked[key]  # keep membership tests exact
 
-        new_booking = {
-            "booking_id": booking_id,
-            "confirmation_code": confirmation_code,
-            "status": "confirmed",
-            "date": payload["date"],
-            "start_time": payload["start_time"],
-            "appointment_type": payload["appointment_type"],
-            "patient_name": payload["patient_name"],
-            "patient_email": payload["patient_email"],
-            "patient_phone": payload["patient_phone"],
-            "reason": payload["reason"],
-            "doctor_id": payload.get("doctor_id"),
-        }
+    @staticmethod
+    def _slot_key(booking):
+        return (booking.get("doctor_id"), booking.get("start_time"))
 
-        bookings.append(new_booking)
-        self._save_bookings(bookings)
+    # ---- operations ----
+    async def book(self, payload):
+        return await asyncio.to_thread(self._book, payload)
+
+    def _new_ids(self):
+        """Unused (booking_id, confirmation_code); caller holds the lock."""
+        n = int(time.time())
+        while f"APPT-{n}" in self._by_id:
+            n += 1  # several bookings in the same second
+        code = uuid.uuid4().hex[:6].upper()
+        while code in self._by_conf:
+            code = uuid.uuid4().hex[:6].upper()
+        return f"APPT-{n}", code
+
+    def _book(self, payload):
+        with self._lock:
+            booking_id, confirmation_code = self._new_ids()
+
+            new_booking = {
+                "booking_id": booking_id,
+                "confirmation_code": confirmation_code,
+                "status": "confirmed",
+                "date": payload["date"],
+                "start_time": payload["start_time"],
+                "appointment_type": payload["appointment_type"],
+                "patient_name": payload["patient_name"],
+                "patient_email": payload["patient_email"],
+                "patient_phone": payload["patient_phone"],
+                "reason": payload["reason"],
+                "doctor_id": payload.get("doctor_id"),
+            }
+
+            self._append(new_booking)
+            self._add(new_booking)
 
         return new_booking
-    
-    def cancel(self, booking_id: str):
-        bookings = self._load_bookings()
-
-        for b in bookings:
-            if b["booking_id"] == booking_id:
-                if b["status"] == "cancelled":
-                    return {
-                        "message": "Already cancelled",
-                        "booking_id": booking_id,
-                        "status": "cancelled"
-                    }
-                b["status"] = "cancelled"
-                self._save_bookings(bookings)
+
+    async def cancel(self, booking_id: str):
+        return await asyncio.to_thread(self._cancel, booking_id)
+
+    def _cancel(self, booking_id: str):
+        with self._lock:
+            b = self._by_id.get(booking_id)
+            if b is None:
+                raise ValueError("Booking not found")
+
+            if b["status"] == "cancelled":
                 return {
+                    "message": "Already cancelled",
                     "booking_id": booking_id,
-                    "status": "cancelled",
-                    "message": "Appointment cancelled successfully."
+                    "status": "cancelled"
                 }
 
-        raise ValueError("Booking not found")
+            self._append({"op": "cancel", "booking_id": booking_id})
+            self._mark_cancelled(b)
+
+        return {
+            "booking_id": booking_id,
+            "status": "cancelled",
+            "message": "Appointment cancelled successfully."
+        }
+
+    def booked_slots(self, date: str):
+        """(doctor_id, start_time) pairs of the active bookings on a date; supports `in`."""
+        return self._booked.get(date, frozenset())
 
-    def get_booking_by_confirmation(self, code: str):
+    async def get_booking_by_confirmation(self, code: str):
         """Retrieve booking by confirmation or booking id"""
-        bookings = self._load_bookings()
-        for b in bookings:
-            if b["confirmation_code"] == code or b["booking_id"] == code:
-                return b
-        return None
\ No newline at end of file
+        return self._by_conf.get(code) or self._by_id.get(code)